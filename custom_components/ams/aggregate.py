@@ -0,0 +1,73 @@
+"""Aggregation of the high frequency power sensors."""
+from custom_components.ams.const import SENSOR_ATTR, SENSOR_STATE, SENSOR_UOM
+
+# Sensors with these units are aggregated
+AGGREGATED_UNITS = ("W", "VAr")
+ATTR_MIN = "min"
+ATTR_MAX = "max"
+
+
+class _Window:
+    """Running min, max and total of one sensor."""
+
+    __slots__ = ("start", "count", "total", "minimum", "maximum")
+
+    def __init__(self, start, value):
+        """Start a window with its first value."""
+        self.start = start
+        self.count = 1
+        self.total = value
+        self.minimum = value
+        self.maximum = value
+
+    def add(self, value):
+        """Add a value to the window."""
+        self.count += 1
+        self.total += value
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+
+
+class PowerAggregator:
+    """Keep a running min/max/mean of the power sensors over a window."""
+
+    def __init__(self, window):
+        """Initialize the aggregator, window is in seconds."""
+        self.window = window
+        self._windows = {}
+        self._aggregated = {}
+
+    def handles(self, key, value):
+        """Return True if the sensor is aggregated."""
+        aggregated = self._aggregated.get(key)
+        if aggregated is None:
+            aggregated = (
+                value[SENSOR_ATTR].get(SENSOR_UOM) in AGGREGATED_UNITS)
+            self._aggregated[key] = aggregated
+        return aggregated
+
+    def add(self, key, value, now):
+        """Add a sensor value read at monotonic time now.
+
+        Returns the aggregated sensor value when the window is complete,
+        otherwise None. The mean is the state, min and max are added to the
+        attributes of the last value.
+        """
+        state = value[SENSOR_STATE]
+        window = self._windows.get(key)
+        if window is None:
+            self._windows[key] = _Window(now, state)
+            return None
+        window.add(state)
+        if now - window.start < self.window:
+            return None
+        del self._windows[key]
+        attributes = dict(value[SENSOR_ATTR])
+        attributes[ATTR_MIN] = window.minimum
+        attributes[ATTR_MAX] = window.maximum
+        return {
+            SENSOR_STATE: round(window.total / window.count, 2),
+            SENSOR_ATTR: attributes,
+        }
@@ -0,0 +1,96 @@
+"""
+Capture of the raw frames received from the HAN port.
+
+A capture file starts with CAPTURE_MAGIC, followed by one record per frame:
+the monotonic time since the first frame in microseconds (unsigned 64 bit),
+the frame length (unsigned 16 bit), both little endian, and the frame
+bytes. Captures are played back through the replay:// serial URL, see
+protocol_replay.
+"""
+import queue
+import struct
+import threading
+import time
+
+CAPTURE_MAGIC = b"AMSCAP1\n"
+_RECORD = struct.Struct("<QH")
+
+
+class CaptureWriter:
+    """Write received frames to a capture file."""
+
+    def __init__(self, path):
+        """Create the capture file, an existing file is replaced."""
+        # pylint: disable=consider-using-with
+        self._file = open(path, "wb")
+        self._file.write(CAPTURE_MAGIC)
+        self._start = None
+        self.frames = 0
+
+    def write(self, frame, now=None):
+        """Append a frame received at monotonic time now."""
+        if now is None:
+            now = time.monotonic()
+        if self._start is None:
+            self._start = now
+        offset = int((now - self._start) * 1e6)
+        self._file.write(_RECORD.pack(offset, len(frame)))
+        self._file.write(frame)
+        self.frames += 1
+
+    def close(self):
+        """Flush and close the capture file."""
+        self._file.close()
+
+
+class CaptureThread(threading.Thread):
+    """Write received frames to a CaptureWriter on a thread of its own.
+
+    write() and close() never block, the file is written and closed on the
+    thread, off the event loop.
+    """
+
+    def __init__(self, writer):
+        """Initialize the thread, started with start()."""
+        super().__init__(name="ams_capture", daemon=True)
+        self._writer = writer
+        self._queue = queue.SimpleQueue()
+        self.frames = 0
+
+    def write(self, frame):
+        """Queue a frame received now."""
+        self._queue.put((time.monotonic(), frame))
+        self.frames += 1
+
+    def close(self):
+        """Close the file once the queued frames are written."""
+        self._queue.put(None)
+
+    def run(self):
+        """Write the queued frames until closed."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            now, frame = item
+            self._writer.write(frame, now)
+        self._writer.close()
+
+
+def read_capture(path):
+    """Yield (seconds, frame) for every frame in a capture file.
+
+    A record cut short at the end of the file is ignored.
+    """
+    with open(path, "rb") as capture:
+        if capture.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError(f"{path} is not an AMS capture file")
+        while True:
+            header = capture.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                return
+            offset, size = _RECORD.unpack(header)
+            frame = capture.read(size)
+            if len(frame) < size:
+                return
+            yield offset / 1e6, frame
@@ -0,0 +1,272 @@
+"""
+Headless collector reading many meters without Home Assistant.
+
+Each meter is a HAN-over-TCP bridge given as a pyserial style URL:
+
+    socket://host:port[?manufacturer=kaifa][&name=garage]
+
+The manufacturer defaults to auto detection and the name to host:port.
+Meter URLs can also be read from a file given as @file, one per line.
+All streams are read on one event loop and decoded by the parsers of the
+integration. Every decoded frame is written as one line of JSON, with the
+values of the sensors the frame carried:
+
+    {"meter": "garage", "serial": "...", "time": 1700000000.0,
+     "values": {"ams_active_power_import": 1234, ...}}
+
+to stdout, or with --socket PATH to every client connected to a unix
+socket. Run with: python -m custom_components.ams.collector URL...
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+import urllib.parse
+
+from custom_components.ams.parsers.decoder import (
+    PARSERS,
+    MeterDecoder,
+    kaifa_swedish,
+)
+from custom_components.ams.parsers.detect import detect_meter
+from custom_components.ams.parsers.hdlc import HdlcProtocol
+from custom_components.ams.parsers.records import MeterIdentity
+
+_LOGGER = logging.getLogger(__name__)
+
+AUTO = "auto"
+# Seconds between reconnects, doubled up to the max while it fails
+RECONNECT_MIN = 1
+RECONNECT_MAX = 60
+# Bytes queued for a socket client before it is dropped as too slow
+CLIENT_BUFFER = 1 << 20
+
+
+def parse_url(url):
+    """Return (name, host, port, manufacturer) of a meter URL."""
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme != "socket" or not parts.hostname or not parts.port:
+        raise ValueError(f"expected socket://host:port, got {url}")
+    options = dict(urllib.parse.parse_qsl(parts.query))
+    manufacturer = options.get("manufacturer", AUTO)
+    if manufacturer != AUTO and manufacturer not in PARSERS:
+        raise ValueError(f"unknown manufacturer {manufacturer} in {url}")
+    name = options.get("name", f"{parts.hostname}:{parts.port}")
+    return name, parts.hostname, parts.port, manufacturer
+
+
+class StdoutSink:
+    """Write the readings to stdout."""
+
+    def __init__(self, stream=None):
+        """Initialize the sink, stream defaults to stdout."""
+        self._stream = stream or sys.stdout
+
+    def write(self, line):
+        """Write one line of JSON."""
+        self._stream.write(line)
+        self._stream.flush()
+
+    def close(self):
+        """Flush the stream."""
+        self._stream.flush()
+
+
+class SocketSink:
+    """Write the readings to every client of a unix socket."""
+
+    def __init__(self):
+        """Initialize the sink, started with start()."""
+        self._server = None
+        self._clients = set()
+
+    async def start(self, path):
+        """Listen on the unix socket path."""
+        self._server = await asyncio.start_unix_server(self._connected,
+                                                       path)
+
+    async def _connected(self, reader, writer):
+        """Add a client, the readings are written to it until it leaves."""
+        self._clients.add(writer)
+        try:
+            await reader.read()
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    def write(self, line):
+        """Write one line of JSON to the clients."""
+        data = line.encode()
+        for writer in list(self._clients):
+            if writer.transport.get_write_buffer_size() > CLIENT_BUFFER:
+                _LOGGER.warning("Dropping client not reading the socket")
+                self._clients.discard(writer)
+                writer.close()
+                continue
+            writer.write(data)
+
+    def close(self):
+        """Stop listening and disconnect the clients."""
+        if self._server is not None:
+            self._server.close()
+        for writer in self._clients:
+            writer.close()
+        self._clients.clear()
+
+
+class _StreamProtocol(HdlcProtocol):
+    """HdlcProtocol resolving a future when the connection is lost."""
+
+    def __init__(self, frame_callback, closed):
+        """Initialize the protocol.
+
+        Partial frames do not time out, TCP loses no bytes within a
+        connection, and with many meters the loop can be busy with the
+        others for longer than the timeout of a serial port.
+        """
+        super().__init__(frame_callback, timeout=None)
+        self.closed = closed
+
+    def connection_lost(self, exc):
+        """Resolve the closed future."""
+        super().connection_lost(exc)
+        if not self.closed.done():
+            self.closed.set_result(exc)
+
+
+class MeterStream:
+    """One meter read from a TCP bridge."""
+
+    def __init__(self, url, sink):
+        """Initialize the stream of the meter URL."""
+        self.name, self.host, self.port, self.manufacturer = parse_url(url)
+        self._auto = self.manufacturer == AUTO
+        self._sink = sink
+        self._decoder = None
+        self._identity = MeterIdentity()
+        self.frames = 0
+
+    @property
+    def rejected(self):
+        """Number of frames rejected by the parser."""
+        if self._decoder is None:
+            return 0
+        return self._decoder.rejected
+
+    def _bind_decoder(self, frame):
+        """Create the decoder, detecting the meter from frame if needed."""
+        if self._auto:
+            detection = detect_meter(frame)
+            if detection is None:
+                _LOGGER.debug("%s: no parser detected", self.name)
+                return False
+            _LOGGER.info("%s: detected %s meter", self.name,
+                         detection.manufacturer)
+            self.manufacturer = detection.manufacturer
+        swedish = None
+        if self.manufacturer == "kaifa" and kaifa_swedish(frame):
+            swedish = True
+        self._decoder = MeterDecoder.for_manufacturer(self.manufacturer,
+                                                      swedish)
+        return True
+
+    def handle_frame(self, frame):
+        """Decode one frame and write its values to the sink."""
+        if not frame.fcs_valid:
+            _LOGGER.debug("%s: invalid frame CRC check", self.name)
+            return
+        detected = False
+        if self._decoder is None:
+            if not self._bind_decoder(frame):
+                return
+            detected = self._auto
+        decoded = self._decoder.decode(frame)
+        if decoded is None:
+            if detected:
+                # Detect again on the next frame
+                self._decoder = None
+            return
+        self.frames += 1
+        if not self._identity.complete:
+            self._identity.update(decoded.han_data)
+        sensor_data = self._decoder.sensor_data
+        self._sink.write(json.dumps({
+            "meter": self.name,
+            "serial": self._identity.serial,
+            "time": time.time(),
+            "values": {key: sensor_data[key]["state"]
+                       for key in decoded.updated},
+        }, default=str) + "\n")
+
+    async def run(self):
+        """Read the meter, reconnecting when the connection is lost."""
+        loop = asyncio.get_running_loop()
+        delay = RECONNECT_MIN
+        while True:
+            closed = loop.create_future()
+            try:
+                await loop.create_connection(
+                    lambda: _StreamProtocol(self.handle_frame, closed),
+                    self.host, self.port)
+            except OSError as ex:
+                _LOGGER.warning("%s: connection failed: %s", self.name, ex)
+            else:
+                _LOGGER.info("%s: connected to %s:%s", self.name,
+                             self.host, self.port)
+                delay = RECONNECT_MIN
+                await closed
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX)
+
+
+async def collect(urls, socket_path=None):
+    """Read the meters until cancelled."""
+    if socket_path:
+        sink = SocketSink()
+        await sink.start(socket_path)
+    else:
+        sink = StdoutSink()
+    meters = [MeterStream(url, sink) for url in urls]
+    try:
+        await asyncio.gather(*(meter.run() for meter in meters))
+    finally:
+        sink.close()
+        for meter in meters:
+            _LOGGER.info("%s: %s frames decoded, %s rejected", meter.name,
+                         meter.frames, meter.rejected)
+
+
+def main(argv=None):
+    """Run the collector from the command line."""
+    parser = argparse.ArgumentParser(
+        prog="python -m custom_components.ams.collector",
+        description="Decode the frames of AMS meters read through TCP "
+                    "bridges to line delimited JSON.",
+        fromfile_prefix_chars="@")
+    parser.add_argument("urls", nargs="+", metavar="URL",
+                        help="socket://host:port[?manufacturer=M][&name=N]")
+    parser.add_argument("--socket", metavar="PATH",
+                        help="write to the clients of this unix socket "
+                             "instead of stdout")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="debug logging")
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+        stream=sys.stderr)
+    try:
+        for url in args.urls:
+            parse_url(url)
+    except ValueError as ex:
+        parser.error(str(ex))
+    try:
+        asyncio.run(collect(args.urls, args.socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
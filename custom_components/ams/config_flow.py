@@ -176,8 +176,10 @@ class AmsFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
 
     async def async_step_import(self, import_config):
         """Import a config flow from configuration."""
-        if self._async_current_entries():
-            _LOGGER.warning("Only one configuration of AMS Reader is allowed.")
+        if any(entry.source == config_entries.SOURCE_IMPORT
+               for entry in self._async_current_entries()):
+            _LOGGER.warning("Only one YAML configuration of AMS Reader is"
+                            " allowed.")
             return self.async_abort(reason="single_instance_allowed")
 
         return self.async_create_entry(title="configuration.yaml",
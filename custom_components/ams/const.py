@@ -1,9 +1,7 @@
 """ Constants for hass-AMS package"""
+from collections import namedtuple
+
 import serial
-from homeassistant.components.sensor import (
-    SensorDeviceClass,
-    SensorStateClass
-)
 
 HAN_OBIS_CODE = "obis_code"
 HAN_PACKET_SIZE = "packet_size"
@@ -50,39 +48,69 @@ SENSOR_STATE = "state"
 AMS_ENERGY_METER = "AMS energy meter"
 AMS_NEW_SENSORS = "ams_new_sensors"
 AMS_SENSORS = "ams_sensors"
-# Devices that we have read from the serial connection.
-AMS_DEVICES = set()
-AMS_SENSOR_CREATED_BUT_NOT_READ = set()
 
+CONF_AGGREGATE_WINDOW = "aggregate_window"
 CONF_BAUDRATE = "baudrate"
+CONF_CAPTURE_FILE = "capture_file"
+CONF_DEADBAND = "deadband"
+CONF_DETECTED = "detected"
 CONF_METER_MANUFACTURER = HAN_METER_MANUFACTURER
 CONF_MANUAL_SERIAL_PORT = "manual_serial_port"
+CONF_MIN_INTERVAL = "min_interval"
 CONF_OSS_BRIKKEN = "oss_brikken"
 CONF_PARITY = "parity"
 CONF_SERIAL_PORT = "serial_port"
 CONF_TCP_PORT = "tcp_port"
 CONF_TCP_HOST = "tcp_host"
+CONF_TRACE_SAMPLE = "trace_sample"
 CONF_PROTOCOL = "protocol"
 CONF_PROTOCOL_CONFIG = "protocol_config"
 CONF_PROTOCOL_TYPE = "type"
+# Meter list variant stored with the detected manufacturer
+DETECTED_SWEDISH = "swedish"
 ATTR_DEVICE_CLASS = "device_class"
 ATTR_LAST_RESET = "last_reset"
 ATTR_STATE_CLASS = "state_class"
+# Values of SensorDeviceClass and SensorStateClass, the parsers do not
+# import Home Assistant.
+DEVICE_CLASS_ENERGY = "energy"
+STATE_CLASS_TOTAL_INCREASING = "total_increasing"
 SERIAL = "serial"
 NETWORK = "tcp_ip"
 
 DOMAIN = "ams"
 
 DEFAULT_SERIAL_PORT = "/dev/ttyUSB0"
+# Seconds the power sensors are aggregated over, 0 publishes every value
+DEFAULT_AGGREGATE_WINDOW = 0
 DEFAULT_BAUDRATE = 2400
 DEFAULT_METER_MANUFACTURER = "auto"
 DEFAULT_OSS_BRIKKEN = False
 DEFAULT_PARITY = serial.PARITY_NONE
 DEFAULT_TIMEOUT = 0.1
+# Smallest change written to the state machine per sensor class. Energy
+# sensors are always written.
+DEFAULT_DEADBAND = {
+    "voltage": 0.5,
+    "current": 0.1,
+    "power": 10,
+}
+# Minimum seconds between two state writes of a filtered sensor
+DEFAULT_MIN_INTERVAL = 0
+# Frames logged at debug level, one of every DEFAULT_TRACE_SAMPLE
+DEFAULT_TRACE_SAMPLE = 1
 
-DATA_FLAG = [230, 231, 0, 15]
+DATA_FLAG = bytes([230, 231, 0, 15])
 FRAME_FLAG = b"\x7e"
 DEC_FRAME_FLAG = 126
+# Reasons a frame is rejected
+FRAME_ERROR_DATA_FLAG = "data_flag"
+FRAME_ERROR_FLAG = "frame_flag"
+FRAME_ERROR_FRAME_CRC = "frame_crc"
+FRAME_ERROR_HEADER_CRC = "header_crc"
+FRAME_ERROR_NO_PARSER = "no_parser"
+FRAME_ERROR_SIZE = "packet_size"
+FRAME_ERROR_TIMEOUT = "timeout"
 AIDON_METER_SEQ = [65, 73, 68, 79, 78, 95]
 AIDON_SE_METER_SEQ_3PH = [126, 162, 67]
 AIDON_SE_METER_SEQ_1PH = [126, 161, 79]
@@ -151,8 +179,8 @@ ACTIVE_ENERGY_SENSORS = [
 ]
 
 ACTIVE_ENERGY_DEFAULT_ATTRS = {
-    ATTR_STATE_CLASS: SensorStateClass.TOTAL_INCREASING,
-    ATTR_DEVICE_CLASS: SensorDeviceClass.ENERGY,
+    ATTR_STATE_CLASS: STATE_CLASS_TOTAL_INCREASING,
+    ATTR_DEVICE_CLASS: DEVICE_CLASS_ENERGY,
 }
 
 CURRENT_SENSORS = [
@@ -190,7 +218,10 @@ MANUFACTURER_OPTIONS = [
 ]
 
 SIGNAL_UPDATE_AMS = "ams_update"
-SIGNAL_NEW_AMS_SENSOR = "ams_new_sensor"
+# Per sensor update signal, formatted with the hub key and the sensor key
+SIGNAL_UPDATE_AMS_SENSOR = SIGNAL_UPDATE_AMS + "_{}_{}"
+# Formatted with the hub key
+SIGNAL_NEW_AMS_SENSOR = "ams_new_sensor_{}"
 
 WEEKDAY_MAPPING = {
     1: "Monday",
@@ -294,3 +325,39 @@ SENSOR_ICON_MAP = {
     HAN_REACTIVE_ENERGY_IMPORT: "gauge",
     HAN_REACTIVE_ENERGY_EXPORT: "gauge",
 }
+
+# Static description of a sensor sent with an OBIS code
+ObisRecord = namedtuple(
+    "ObisRecord",
+    ["obis", "key", "unit", "icon", "state_class", "device_class"],
+)
+
+
+def _obis_registry():
+    """Map the OBIS codes of the sensor maps to their ObisRecord."""
+    registry = {}
+    for obis_map in (SENSOR_COMMON_OBIS_MAP, SENSOR_OBIS_MAP):
+        for key, codes in obis_map.items():
+            if not isinstance(codes[0], list):
+                codes = [codes]
+            icon = SENSOR_ICON_MAP.get(key)
+            state_class = None
+            if key in ACTIVE_ENERGY_SENSORS:
+                state_class = STATE_CLASS_TOTAL_INCREASING
+            device_class = None
+            if key in HOURLY_SENSORS:
+                device_class = DEVICE_CLASS_ENERGY
+            for code in codes:
+                registry[bytes(code)] = ObisRecord(
+                    ".".join(str(elem) for elem in code),
+                    key,
+                    SENSOR_UNIT.get(key),
+                    icon and "mdi:" + icon,
+                    state_class,
+                    device_class,
+                )
+    return registry
+
+
+# OBIS code bytes to ObisRecord, built once at import
+OBIS_REGISTRY = _obis_registry()
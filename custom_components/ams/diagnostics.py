@@ -0,0 +1,28 @@
+"""Diagnostics support for AMS."""
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from custom_components.ams.const import (
+    CONF_TCP_HOST,
+    DOMAIN,
+    HAN_METER_SERIAL,
+)
+
+TO_REDACT = {CONF_TCP_HOST, HAN_METER_SERIAL}
+
+
+async def async_get_config_entry_diagnostics(
+        hass: HomeAssistant, entry: ConfigEntry) -> dict:
+    """Return the frame statistics of the hub."""
+    hub = hass.data[DOMAIN][entry.entry_id]
+    return {
+        "entry": async_redact_data(dict(entry.data), TO_REDACT),
+        "meter": {
+            "manufacturer": hub.meter_manufacturer,
+            "type": hub.meter_type,
+        },
+        "frames": hub.stats.as_dict(),
+        "handoff": hub.handoff_stats,
+        "suppressed_writes": hub.suppressed_writes,
+    }
@@ -0,0 +1,65 @@
+"""Coalescing handoff from the HAN reader to the Home Assistant event loop."""
+import logging
+import threading
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class CoalescingHandoff:
+    """Single slot handoff delivering the latest item on the event loop.
+
+    put() never blocks. If the loop has not consumed the previous item yet,
+    the newer one replaces it and the frame is counted as coalesced.
+    """
+
+    def __init__(self, loop, consumer):
+        """Initialize the handoff."""
+        self._loop = loop
+        self._consumer = consumer
+        self._lock = threading.Lock()
+        self._pending = None
+        self._scheduled = False
+        self._closed = False
+        self.delivered = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def put(self, item):
+        """Offer an item to the consumer, safe to call from any thread."""
+        with self._lock:
+            if self._closed:
+                self.dropped += 1
+                return
+            self._pending = item
+            if self._scheduled:
+                self.coalesced += 1
+                return
+            self._scheduled = True
+        self._loop.call_soon_threadsafe(self._deliver)
+
+    def close(self):
+        """Stop delivering, a pending item is dropped."""
+        with self._lock:
+            self._closed = True
+            if self._scheduled:
+                self.dropped += 1
+            self._pending = None
+
+    def as_dict(self):
+        """Return the counters for the diagnostics."""
+        return {
+            "delivered": self.delivered,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+        }
+
+    def _deliver(self):
+        """Hand the pending item to the consumer, runs on the event loop."""
+        with self._lock:
+            item = self._pending
+            self._pending = None
+            self._scheduled = False
+            if self._closed:
+                return
+        self.delivered += 1
+        self._consumer(item)
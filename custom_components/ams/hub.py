@@ -0,0 +1,530 @@
+"""AMS hub platform."""
+import logging
+import time
+
+import homeassistant.helpers.config_validation as cv
+import serial
+import serial_asyncio
+import voluptuous as vol
+
+from homeassistant.config_entries import ConfigEntry, SOURCE_IMPORT
+from homeassistant.const import Platform
+from homeassistant.core import Config, HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from custom_components.ams.aggregate import PowerAggregator
+from custom_components.ams.capture import CaptureThread, CaptureWriter
+from custom_components.ams.handoff import CoalescingHandoff
+from custom_components.ams.parsers.decoder import (
+    PARSERS,
+    MeterDecoder,
+    kaifa_swedish,
+    load_parser,
+)
+from custom_components.ams.parsers.detect import detect_meter
+from custom_components.ams.parsers.hdlc import HdlcProtocol
+from custom_components.ams.parsers.records import MeterIdentity
+from custom_components.ams.stats import PipelineStats, STAGE_DISPATCH
+from custom_components.ams.trace import FrameTracer, HexDump
+from custom_components.ams.const import (
+    CONF_AGGREGATE_WINDOW,
+    CONF_BAUDRATE,
+    CONF_CAPTURE_FILE,
+    CONF_DEADBAND,
+    CONF_DETECTED,
+    CONF_METER_MANUFACTURER,
+    CONF_MIN_INTERVAL,
+    CONF_OSS_BRIKKEN,
+    CONF_PARITY,
+    CONF_PROTOCOL,
+    CONF_SERIAL_PORT,
+    CONF_TCP_HOST,
+    CONF_TCP_PORT,
+    CONF_TRACE_SAMPLE,
+    DEFAULT_AGGREGATE_WINDOW,
+    DEFAULT_BAUDRATE,
+    DEFAULT_DEADBAND,
+    DEFAULT_METER_MANUFACTURER,
+    DEFAULT_MIN_INTERVAL,
+    DEFAULT_OSS_BRIKKEN,
+    DEFAULT_PARITY,
+    DEFAULT_SERIAL_PORT,
+    DEFAULT_TRACE_SAMPLE,
+    DETECTED_SWEDISH,
+    DOMAIN,
+    FRAME_ERROR_FRAME_CRC,
+    FRAME_ERROR_NO_PARSER,
+    HAN_LIST_VER_ID,
+    HAN_METER_MANUFACTURER,
+    HAN_METER_SERIAL,
+    HAN_METER_TYPE,
+    NETWORK,
+    SERIAL,
+    SIGNAL_NEW_AMS_SENSOR,
+    SIGNAL_UPDATE_AMS_SENSOR,
+)
+
+PLATFORMS: list[Platform] = [Platform.SENSOR]
+
+_LOGGER = logging.getLogger(__name__)
+
+# Serves replay:// ports from protocol_replay
+if __package__ not in serial.protocol_handler_packages:
+    serial.protocol_handler_packages.append(__package__)
+
+SERIAL_SCHEMA = {vol.Required(CONF_SERIAL_PORT, default=DEFAULT_SERIAL_PORT)}
+NETWORK_SCHEMA = {vol.Required(CONF_TCP_HOST), vol.Required(CONF_TCP_PORT)}
+PROTOCOL_SCHEMA = {
+    vol.Required(SERIAL): SERIAL_SCHEMA,
+    vol.Required(NETWORK): NETWORK_SCHEMA,
+}
+CONFIG_SCHEMA = vol.Schema(
+    {
+        DOMAIN: vol.Schema(
+            {
+                vol.Required(CONF_PROTOCOL, default=SERIAL): vol.In(
+                    [NETWORK, SERIAL]),
+                vol.Optional(CONF_TCP_HOST): str,
+                vol.Optional(CONF_TCP_PORT): vol.All(
+                    vol.Coerce(int), vol.Range(0, 65535)
+                ),
+                vol.Optional(CONF_SERIAL_PORT): str,
+                vol.Optional(CONF_PARITY, default=DEFAULT_PARITY): cv.string,
+                vol.Optional(CONF_BAUDRATE, default=DEFAULT_BAUDRATE): vol.All(
+                    vol.Coerce(int), vol.Range(0, 256000)
+                ),
+                vol.Optional(
+                    CONF_METER_MANUFACTURER, default=DEFAULT_METER_MANUFACTURER
+                ): cv.string,
+                vol.Optional(
+                    CONF_OSS_BRIKKEN, default=DEFAULT_OSS_BRIKKEN
+                ): vol.All(vol.Any(int, bool), vol.Coerce(bool)),
+                vol.Optional(CONF_DEADBAND): {
+                    vol.In(DEFAULT_DEADBAND): vol.Coerce(float)
+                },
+                vol.Optional(
+                    CONF_MIN_INTERVAL, default=DEFAULT_MIN_INTERVAL
+                ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+                vol.Optional(
+                    CONF_AGGREGATE_WINDOW, default=DEFAULT_AGGREGATE_WINDOW
+                ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+                vol.Optional(CONF_CAPTURE_FILE): cv.string,
+                vol.Optional(
+                    CONF_TRACE_SAMPLE, default=DEFAULT_TRACE_SAMPLE
+                ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+            }
+        )
+    },
+    extra=vol.ALLOW_EXTRA,
+)
+
+
+async def async_setup(hass: HomeAssistant, config: Config):
+    """AMS hub YAML setup.
+
+    The YAML configuration is imported to a config entry, which sets up the
+    hub like any other entry.
+    """
+    hass.data.setdefault(DOMAIN, {})
+    if config.get(DOMAIN) is None:
+        _LOGGER.info("No YAML config available, using config_entries")
+        return True
+    for entry in hass.config_entries.async_entries(DOMAIN):
+        if entry.source == SOURCE_IMPORT:
+            # configuration.yaml wins over the imported copy, the stored
+            # detection is kept.
+            data = dict(config[DOMAIN])
+            if CONF_DETECTED in entry.data:
+                data[CONF_DETECTED] = entry.data[CONF_DETECTED]
+            hass.config_entries.async_update_entry(entry, data=data)
+            return True
+    hass.async_create_task(
+        hass.config_entries.flow.async_init(
+            DOMAIN, context={"source": SOURCE_IMPORT}, data=config[DOMAIN]
+        )
+    )
+    return True
+
+
+async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
+    """Set up AMS as config entry, one hub per entry."""
+    hub = AmsHub(hass, entry.data, entry)
+    hass.data.setdefault(DOMAIN, {})[entry.entry_id] = hub
+    await hub.async_connect()
+    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    return True
+
+
+async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
+    """Unload a config entry."""
+    unloaded = await hass.config_entries.async_unload_platforms(
+        entry, PLATFORMS)
+    if unloaded:
+        hub = hass.data.get(DOMAIN, {}).pop(entry.entry_id, None)
+        if hub is not None:
+            hub.stop_serial_read()
+    return unloaded
+
+
+class AmsHub:
+    """AmsHub wrapper for all sensors."""
+
+    def __init__(self, hass, entry, config_entry=None):
+        """Initialize the AMS hub."""
+        _LOGGER.debug("config entry = %s", entry)
+        self._hass = hass
+        self._entry = entry
+        self._config_entry = config_entry
+        # Key of the hub in hass.data and its dispatcher signals
+        self.key = DOMAIN
+        if config_entry is not None:
+            self.key = config_entry.entry_id
+        # Sensors created for this meter
+        self.devices = set()
+        # Hourly sensors created to restore their state, before a value
+        # is read.
+        self.created_but_not_read = set()
+        self.meter_manufacturer = entry.get(CONF_METER_MANUFACTURER)
+        # Values as published to the sensors, the decoder keeps the values
+        # as parsed.
+        self.sensor_data = {}
+        self._identity = MeterIdentity()
+        self._updated_sensors = set()
+        self._transport = None
+        self._capture = None
+        self._handoff = CoalescingHandoff(
+            hass.loop, self._check_for_new_sensors_and_update)
+        self.oss = None
+        if entry.get(CONF_PROTOCOL) == SERIAL:
+            self.oss = entry.get(CONF_OSS_BRIKKEN)
+        self.stats = PipelineStats()
+        self._tracer = FrameTracer(
+            _LOGGER, entry.get(CONF_TRACE_SAMPLE, DEFAULT_TRACE_SAMPLE))
+        self._decoder = None
+        # Parser modules imported in the executor, by manufacturer
+        self._parsers = {}
+        # Import of the parser of a detected meter, the frame is handled
+        # when it is done.
+        self._load_task = None
+        # The parser bound from the stored detection is verified against
+        # the first frame.
+        self._verify_parser = False
+        self._stored_swedish = None
+        self._detection_stored = False
+        self._load_detection(entry.get(CONF_DETECTED))
+        self.deadband = {**DEFAULT_DEADBAND,
+                         **(entry.get(CONF_DEADBAND) or {})}
+        self.min_interval = entry.get(CONF_MIN_INTERVAL, DEFAULT_MIN_INTERVAL)
+        self.suppressed_writes = 0
+        self._aggregator = None
+        window = entry.get(CONF_AGGREGATE_WINDOW, DEFAULT_AGGREGATE_WINDOW)
+        if window:
+            self._aggregator = PowerAggregator(window)
+        _LOGGER.debug("Finish init of AMS")
+
+    async def async_connect(self):
+        """Open the connection to the HAN port."""
+        loop = self._hass.loop
+        entry = self._entry
+        capture_file = entry.get(CONF_CAPTURE_FILE)
+        if self.meter_manufacturer in PARSERS:
+            # Configured or stored, ready for the first frame
+            await self._async_load_parser(self.meter_manufacturer)
+        try:
+            if capture_file:
+                _LOGGER.info("Capturing frames to %s", capture_file)
+                writer = await self._hass.async_add_executor_job(
+                    CaptureWriter, capture_file)
+                self._capture = CaptureThread(writer)
+                self._capture.start()
+            if entry.get(CONF_PROTOCOL) == SERIAL:
+                port = entry.get(CONF_SERIAL_PORT)
+                _LOGGER.debug("Connecting to HAN using serialport %s", port)
+                self._transport, _ = (
+                    await serial_asyncio.create_serial_connection(
+                        loop,
+                        self._protocol_factory,
+                        port,
+                        baudrate=entry.get(CONF_BAUDRATE),
+                        parity=entry.get(CONF_PARITY),
+                        stopbits=serial.STOPBITS_ONE,
+                        bytesize=serial.EIGHTBITS,
+                    )
+                )
+            elif entry.get(CONF_PROTOCOL) == NETWORK:
+                host = entry.get(CONF_TCP_HOST)
+                port = entry.get(CONF_TCP_PORT)
+                _LOGGER.debug("Connecting to HAN using TCP/IP %s:%s", host,
+                              port)
+                self._transport, _ = await loop.create_connection(
+                    self._protocol_factory, host, port)
+        except (OSError, serial.serialutil.SerialException) as ex:
+            _LOGGER.warning("Serial error: %s", ex)
+
+    def _protocol_factory(self):
+        """Create the protocol receiving frames from the HAN port."""
+        return HdlcProtocol(self._handle_frame, oss=self.oss,
+                            stats=self.stats)
+
+    def stop_serial_read(self):
+        """Close resources."""
+        _LOGGER.debug("stop_serial_read")
+        self._handoff.close()
+        if self._load_task is not None:
+            self._load_task.cancel()
+            self._load_task = None
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+        if self._capture is not None:
+            _LOGGER.info("Captured %s frames", self._capture.frames)
+            self._capture.close()
+            self._capture = None
+
+    @property
+    def handoff_stats(self):
+        """Counters of the sensor data handed to the event loop."""
+        return self._handoff.as_dict()
+
+    @property
+    def meter_serial(self):
+        """The electrical meter's serial number"""
+        return self._identity.serial
+
+    @property
+    def meter_type(self):
+        """The electrical meter's type"""
+
+        return self._identity.meter_type
+
+    def _load_detection(self, detected):
+        """Use the parser and identity stored by an earlier start."""
+        if not detected:
+            return
+        self._identity = MeterIdentity(
+            detected.get(HAN_METER_SERIAL),
+            detected.get(HAN_LIST_VER_ID),
+            detected.get(HAN_METER_TYPE),
+        )
+        if self.meter_manufacturer not in ("auto", None):
+            return
+        self.meter_manufacturer = detected.get(HAN_METER_MANUFACTURER)
+        if self.meter_manufacturer not in PARSERS:
+            self.meter_manufacturer = "auto"
+            return
+        self._stored_swedish = detected.get(DETECTED_SWEDISH) or None
+        self._verify_parser = True
+        _LOGGER.info("Using stored detection of %s meter %s",
+                     self.meter_manufacturer, self._identity.serial)
+
+    def _update_identity(self, han_data):
+        """Complete the meter identity, rebuilt when the serial changes.
+
+        No sensors are created until the identity of the new meter is
+        complete, they would get the unique_id of the previous one.
+        """
+        identity = self._identity
+        serial = han_data.get(HAN_METER_SERIAL)
+        if serial and identity.complete and serial != identity.serial:
+            _LOGGER.warning("Meter serial changed from %s to %s",
+                            identity.serial, serial)
+            identity = self._identity = MeterIdentity()
+            self._detection_stored = False
+        if not identity.complete:
+            identity.update(han_data)
+
+    def _store_detection(self, han_data):
+        """Write the detected meter to the config entry for the next start.
+
+        Done once per start, when the identity is complete and a frame
+        carrying the meter serial confirms it.
+        """
+        identity = self._identity
+        if not han_data.get(HAN_METER_SERIAL) or not identity.complete:
+            return
+        self._detection_stored = True
+        if self._config_entry is None:
+            return
+        detected = {
+            HAN_METER_MANUFACTURER: self.meter_manufacturer,
+            DETECTED_SWEDISH: bool(self._decoder.swedish),
+            HAN_METER_SERIAL: identity.serial,
+            HAN_LIST_VER_ID: identity.manufacturer,
+            HAN_METER_TYPE: identity.meter_type,
+        }
+        data = self._config_entry.data
+        if data.get(CONF_DETECTED) == detected:
+            return
+        _LOGGER.debug("Storing meter detection %s", detected)
+        self._hass.config_entries.async_update_entry(
+            self._config_entry, data={**data, CONF_DETECTED: detected})
+
+    def _select_parser(self, detect_pkg):
+        """Select the parser for the configured or detected manufacturer."""
+        swedish = None
+        if self.meter_manufacturer not in PARSERS:
+            return None, swedish
+        if self.meter_manufacturer == "kaifa":
+            if detect_pkg and kaifa_swedish(detect_pkg):
+                swedish = True
+        return self._parsers[self.meter_manufacturer], swedish
+
+    async def _async_load_parser(self, manufacturer):
+        """Import the parser module of manufacturer in the executor."""
+        if manufacturer not in self._parsers:
+            self._parsers[manufacturer] = (
+                await self._hass.async_add_executor_job(
+                    load_parser, manufacturer))
+
+    async def _async_handle_after_load(self, frame, detect_pkg):
+        """Import the parser of the meter, then handle its first frame."""
+        await self._async_load_parser(self.meter_manufacturer)
+        self._load_task = None
+        if self._decoder is None and self._bind_decoder(detect_pkg):
+            self._decode_frame(frame, detect_pkg)
+
+    def _bind_decoder(self, detect_pkg):
+        """Create the decoder of the meter, False if there is no parser."""
+        parser, swedish = self._select_parser(detect_pkg)
+        if parser is None:
+            self.stats.reject(FRAME_ERROR_NO_PARSER)
+            return False
+        if self._verify_parser:
+            swedish = self._stored_swedish
+        self._decoder = MeterDecoder(parser, swedish, self.oss, self.stats)
+        return True
+
+    @callback
+    def _handle_frame(self, frame):
+        """Validate, parse and publish one frame from the HAN port."""
+        if self._capture is not None:
+            # Queued, the file is written on the capture thread
+            self._capture.write(frame)
+        if not frame.fcs_valid and not self.oss:
+            # Checked while the frame was received, OSS brikken frames are
+            # left to the parser.
+            _LOGGER.debug("Invalid frame CRC check")
+            self.stats.reject(FRAME_ERROR_FRAME_CRC)
+            return
+        detect_pkg = None
+        if self._decoder is None:
+            if self._load_task is not None:
+                # The parser of the first frame is being imported
+                return
+            # detect_pkg is needed to push the package used for
+            # detecting the meter straight to the parser. If not, users will
+            # get unknown state class None for energy sensors at startup.
+            if self.meter_manufacturer in ("auto", None):
+                _LOGGER.info("Autodetecting meter manufacturer")
+                detect_pkg = frame
+                self.meter_manufacturer = self._find_parser(detect_pkg)
+            if (self.meter_manufacturer in PARSERS
+                    and self.meter_manufacturer not in self._parsers):
+                # Imported in the executor, not on the event loop
+                self._load_task = self._hass.async_create_task(
+                    self._async_handle_after_load(frame, detect_pkg))
+                return
+            if not self._bind_decoder(detect_pkg):
+                return
+        self._decode_frame(frame, detect_pkg)
+
+    def _decode_frame(self, frame, detect_pkg):
+        """Decode a frame and publish its values."""
+        decoded = self._decoder.decode(frame)
+        if decoded is not None:
+            self._tracer.trace("data read from port", frame)
+            han_data = decoded.han_data
+            if self._verify_parser:
+                self._verify_parser = False
+                _LOGGER.debug("Stored detection verified")
+            self._update_identity(han_data)
+            if not self._detection_stored:
+                self._store_detection(han_data)
+            self._publish(decoded.updated)
+            self._handoff.put(self.sensor_data)
+        else:
+            _LOGGER.debug("failed package: %s", HexDump(frame))
+            if detect_pkg is not None or self._verify_parser:
+                # The detected parser does not accept the frame it was
+                # detected from, detect again on the next frame.
+                _LOGGER.info("Detected parser rejected the frame")
+                if self._verify_parser:
+                    # The stored meter is gone, so is its identity
+                    self._verify_parser = False
+                    self._identity = MeterIdentity()
+                self._decoder = None
+                self.meter_manufacturer = "auto"
+
+    def _publish(self, updated):
+        """Publish the sensor values the last frame carried."""
+        aggregator = self._aggregator
+        parsed = self._decoder.sensor_data
+        now = time.monotonic()
+        for key in updated:
+            value = parsed[key]
+            if aggregator is not None and aggregator.handles(key, value):
+                aggregate = aggregator.add(key, value, now)
+                if key in self.sensor_data:
+                    if aggregate is None:
+                        continue
+                    value = aggregate
+            self.sensor_data[key] = value
+            self._updated_sensors.add(key)
+
+    @classmethod
+    def _find_parser(cls, pkg):
+        """Helper to detect meter manufacturer."""
+        detection = detect_meter(pkg)
+        if detection is None:
+            _LOGGER.warning("No parser detected")
+            _LOGGER.debug("Meter detection package dump: %s", HexDump(pkg))
+            return None
+        _LOGGER.info("Detected %s meter, confidence %s",
+                     detection.manufacturer, detection.confidence)
+        return detection.manufacturer
+
+    @property
+    def data(self):
+        """Return sensor data."""
+        return self.sensor_data
+
+    def missing_attrs(self):
+        """Check if we have any missing attrs that we need."""
+        miss_attrs = self._identity.missing()
+        if miss_attrs:
+            _LOGGER.debug("We miss some attributes: %s", miss_attrs)
+            return True
+        return False
+
+    def _check_for_new_sensors_and_update(self, sensor_data):
+        """Compare sensor list and update."""
+        start = time.perf_counter_ns()
+        updated, self._updated_sensors = self._updated_sensors, set()
+        # Only wake the sensors that got a value since the last update. The
+        # hourly sensors restored at start have an entity, they are devices
+        # from their first value.
+        for key in updated:
+            if key in self.created_but_not_read:
+                self.devices.add(key)
+            if key in self.devices:
+                async_dispatcher_send(
+                    self._hass,
+                    SIGNAL_UPDATE_AMS_SENSOR.format(self.key, key))
+        sensors_in_data = set(sensor_data.keys())
+        new_devices = sensors_in_data.difference(self.devices)
+
+        if new_devices:
+            # Check that we have all the info we need before the sensors are
+            # created, the most important one is the meter_serial as this is
+            # use to create the unique_id
+            if self.missing_attrs() is True:
+                _LOGGER.debug(
+                    "Missing some attributes waiting for new read from the"
+                    " serial"
+                )
+            else:
+                _LOGGER.debug("Got %s new devices from the serial",
+                              len(new_devices))
+                _LOGGER.debug("DUMP %s", sensor_data)
+                async_dispatcher_send(
+                    self._hass, SIGNAL_NEW_AMS_SENSOR.format(self.key))
+        self.stats.record(STAGE_DISPATCH, start)
@@ -4,34 +4,72 @@ import logging
 _LOGGER = logging.getLogger(__name__)
 
 
+def as_bytes(pkt):
+    """Return the packet as a byte buffer.
+
+    bytes and bytearray, frames from HdlcFrameBuffer included, are returned
+    as they are, packets given as a list of ints are copied to bytes.
+    """
+    if isinstance(pkt, (bytes, bytearray)):
+        return pkt
+    return bytes(pkt)
+
+
 def field_type(default="", fields=None, enc=str, dec=None):
     """Obis/data field decoder/encoder."""
-    # _LOGGER.debug("field_type=%s", fields)
-    data = default.join(enc(i) for i in fields)
+    if enc is chr and not default:
+        # One character per byte
+        data = bytes(fields).decode("latin-1")
+    else:
+        data = default.join(enc(i) for i in fields)
     if dec:
         return dec(data)
     return data
 
 
 def byte_decode(fields=None, count=4):
-    """Data content decoder."""
-    # _LOGGER.debug("byte_decode=%s", fields)
-    if count == 2:
-        data = fields[0] << 8 | fields[1]
-        return data
+    """Data content decoder, unsigned big endian of the first count bytes."""
+    return int.from_bytes(fields[:count], "big")
 
-    data = fields[0] << 24 | fields[1] << 16 | fields[2] << 8 | fields[3]
 
-    return data
+def signed_decode(fields=None):
+    """Signed value decoder, big endian two's complement."""
+    return int.from_bytes(fields, "big", signed=True)
 
 
-def signed_decode(fields=None):
-    """Signed value decoder."""
-    s_data = fields
-    hex_val = ""
-    for num in s_data:
-        hex_val += hex(num)[2:]
-    t = int(hex_val, 16)
-    if t & (1 << (16 - 1)):
-        t -= 1 << 16
-    return t
+# Octet-string tag and length preceding every OBIS code in the payload.
+OBIS_TAG = b"\x09\x06"
+
+
+def obis_index(*obis_maps):
+    """Build a lookup from OBIS code bytes to sensor key."""
+    index = {}
+    for obis_map in obis_maps:
+        for key, codes in obis_map.items():
+            if isinstance(codes[0], list):
+                for code in codes:
+                    index[bytes(code)] = key
+            else:
+                index[bytes(codes)] = key
+    return index
+
+
+def obis_walk(pkt, index):
+    """Find the known OBIS codes of a packet in one pass.
+
+    Returns a list of (key, code, position) for every code found in index,
+    where position is the index of the first OBIS byte in the packet.
+    """
+    data = as_bytes(pkt)
+    found = []
+    start = data.find(OBIS_TAG)
+    while start != -1:
+        pos = start + 2
+        code = data[pos:pos + 6]
+        key = index.get(code)
+        if key is None:
+            start = data.find(OBIS_TAG, start + 1)
+        else:
+            found.append((key, code, pos))
+            start = data.find(OBIS_TAG, pos + 6)
+    return found
@@ -0,0 +1,66 @@
+"""
+CRC-16/X25 used for the HDLC header (HCS) and frame (FCS) check sequences.
+
+The checksum is computed from a precomputed 256 entry table. The functions
+take start and stop indexes so packets are checked in place, without
+slicing copies, and the register can be carried over between calls when
+a frame arrives in several chunks.
+"""
+
+CRC_INIT = 0xFFFF
+CRC_XOROUT = 0xFFFF
+# Reflected form of the polynomial 0x1021
+CRC_POLY = 0x8408
+
+
+def _make_table():
+    """Build the lookup table for the reflected polynomial."""
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ CRC_POLY
+            else:
+                crc >>= 1
+        table.append(crc)
+    return tuple(table)
+
+
+CRC_TABLE = _make_table()
+
+
+def crc16_x25_update(crc, data, start=0, stop=None):
+    """Feed data[start:stop] to the CRC register, returns the register."""
+    table = CRC_TABLE
+    if stop is None:
+        stop = len(data)
+    for pos in range(start, stop):
+        crc = (crc >> 8) ^ table[(crc ^ data[pos]) & 0xFF]
+    return crc
+
+
+def crc16_x25(data, start=0, stop=None):
+    """Return the CRC-16/X25 checksum of data[start:stop]."""
+    return crc16_x25_update(CRC_INIT, data, start, stop) ^ CRC_XOROUT
+
+
+def check_sequence(data, start, stop):
+    """Return True if the two bytes at stop hold the checksum of the range.
+
+    HDLC sends the check sequence least significant byte first.
+    """
+    return (crc16_x25(data, start, stop)
+            == data[stop] | data[stop + 1] << 8)
+
+
+def frame_check(data):
+    """Return True if the frame check sequence of a whole frame holds.
+
+    Frames from HdlcFrameBuffer carry the result computed while they were
+    received, other packets are checked here.
+    """
+    fcs_valid = getattr(data, "fcs_valid", None)
+    if fcs_valid is None:
+        return check_sequence(data, 1, len(data) - 3)
+    return fcs_valid
@@ -0,0 +1,122 @@
+"""
+Streaming decoder for the HAN port.
+
+Framing, validation and decoding of the meter lists in one object. Received
+bytes are pushed in chunks of any size with feed(), frames are taken out of
+the frame buffer one at a time and decoded by the parser of the meter.
+Besides the partial frame being received, only the frame being decoded is
+held in memory.
+"""
+import importlib
+import time
+from collections import namedtuple
+
+from custom_components.ams.const import FRAME_ERROR_FRAME_CRC
+from custom_components.ams.parsers import field_type
+from custom_components.ams.parsers.hdlc import HdlcFrameBuffer
+from custom_components.ams.stats import STAGE_PARSE, STAGE_VALIDATE
+
+# Parser module of every manufacturer, only the one of the meter is
+# imported. The signatures detecting the manufacturer are in detect.
+PARSERS = {
+    "aidon": "custom_components.ams.parsers.aidon",
+    "aidon_se": "custom_components.ams.parsers.aidon_se",
+    "kaifa": "custom_components.ams.parsers.kaifa",
+    "kaifa_se": "custom_components.ams.parsers.kaifa_se",
+    "kamstrup": "custom_components.ams.parsers.kamstrup",
+}
+
+# han_data of the frame and the keys of the sensors it carried a value for
+DecodedFrame = namedtuple("DecodedFrame", ["han_data", "updated"])
+
+# Type of the Kaifa meters sending the Swedish lists
+KAIFA_SWEDISH_TYPE = "MA304H4D"
+
+
+def load_parser(manufacturer):
+    """Import the parser module of a meter_manufacturer option value."""
+    return importlib.import_module(PARSERS[manufacturer])
+
+
+def kaifa_swedish(pkg):
+    """Return True if pkg is a list of a Kaifa meter sending Swedish lists."""
+    return field_type(fields=pkg[62:70], enc=chr) == KAIFA_SWEDISH_TYPE
+
+
+class MeterDecoder:
+    """Decode the frames of one meter, keeping the sensor values."""
+
+    def __init__(self, parser, swedish=None, oss=False, stats=None):
+        """Initialize the decoder with the parser module of the meter.
+
+        stats is an optional PipelineStats timing validation and parsing.
+        """
+        self.parser = parser
+        self.swedish = swedish
+        self.oss = oss
+        self.stats = stats
+        self.sensor_data = {}
+        self.rejected = 0
+        self._frames = HdlcFrameBuffer(oss=oss, stats=stats)
+
+    @classmethod
+    def for_manufacturer(cls, manufacturer, swedish=None, oss=False,
+                         stats=None):
+        """Create a decoder for a meter_manufacturer option value."""
+        return cls(load_parser(manufacturer), swedish, oss, stats)
+
+    def decode(self, frame):
+        """Validate and decode one complete frame.
+
+        Returns a DecodedFrame, or None if the parser rejects the frame.
+        """
+        # The frame is passed as it is, the parsers decode the bytes and use
+        # the frame check sequence checked while it was received.
+        data = frame
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter_ns()
+        error = self.parser.frame_error(data, self.oss)
+        if stats is not None:
+            stats.record(STAGE_VALIDATE, start)
+        if error is not None:
+            self.rejected += 1
+            if stats is not None:
+                stats.reject(error)
+            return None
+        if stats is not None:
+            start = time.perf_counter_ns()
+        previous = self.sensor_data.copy()
+        if self.swedish:
+            self.sensor_data, han_data = self.parser.parse_data(
+                self.sensor_data, data, self.swedish)
+        else:
+            self.sensor_data, han_data = self.parser.parse_data(
+                self.sensor_data, data)
+        # The parsers create new values for the sensors in the frame and
+        # keep the values of the others.
+        updated = tuple(key for key, value in self.sensor_data.items()
+                        if previous.get(key) is not value)
+        if stats is not None:
+            stats.record(STAGE_PARSE, start)
+            stats.count_frame()
+        return DecodedFrame(han_data, updated)
+
+    def feed(self, chunk):
+        """Push received bytes, returns an iterator of DecodedFrame."""
+        self._frames.feed(chunk)
+        return self._decode_frames()
+
+    def _decode_frames(self):
+        """Decode the complete frames, one at a time."""
+        frame = self._frames.pop()
+        while frame is not None:
+            if frame.fcs_valid or self.oss:
+                decoded = self.decode(frame)
+                if decoded is not None:
+                    yield decoded
+            else:
+                self.rejected += 1
+                if self.stats is not None:
+                    self.stats.reject(FRAME_ERROR_FRAME_CRC)
+            frame = self._frames.pop()
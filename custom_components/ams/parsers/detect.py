@@ -0,0 +1,74 @@
+"""
+Meter autodetection.
+
+All manufacturer signatures are compiled into one regular expression, so a
+frame is classified in a single scan. Detection is done on the first frame
+with a valid frame check sequence.
+"""
+import re
+from collections import namedtuple
+
+from custom_components.ams.const import (
+    AIDON_METER_SEQ,
+    AIDON_SE_METER_SEQ_1PH,
+    AIDON_SE_METER_SEQ_3PH,
+    KAIFA_SE_METER_SEQ,
+    KAMSTRUP_METER_SEQ,
+)
+from custom_components.ams.parsers import field_type
+
+Detection = namedtuple("Detection", ["manufacturer", "confidence"])
+
+AIDON_SIGNATURE = bytes(AIDON_METER_SEQ)
+AIDON_SE_SIGNATURES = (bytes(AIDON_SE_METER_SEQ_3PH),
+                       bytes(AIDON_SE_METER_SEQ_1PH))
+KAIFA_SIGNATURE = bytes(KAIFA_SE_METER_SEQ)
+KAMSTRUP_SIGNATURE = bytes(KAMSTRUP_METER_SEQ)
+# Active power import OBIS code, only sent with OBIS codes by Swedish Kaifa
+KAIFA_SE_SIGNATURE = bytes([1, 0, 1, 7, 0, 255])
+KAIFA_MA304H4D = "MA304H4D"
+
+# The manufacturer list version id identifies the meter
+CONFIDENCE_ID = 1.0
+# Kaifa id found, but nothing telling the Norwegian and Swedish lists apart
+CONFIDENCE_VARIANT = 0.8
+# Only the frame header matched
+CONFIDENCE_HEADER = 0.5
+
+# A lookahead finds overlapping signatures as well
+_SCANNER = re.compile(
+    b"(?=("
+    + b"|".join(re.escape(signature) for signature in (
+        AIDON_SIGNATURE,
+        *AIDON_SE_SIGNATURES,
+        KAIFA_SIGNATURE,
+        KAMSTRUP_SIGNATURE,
+        KAIFA_SE_SIGNATURE,
+    ))
+    + b"))"
+)
+
+
+def scan_signatures(pkg):
+    """Return the set of signatures found in the packet."""
+    return {match.group(1) for match in _SCANNER.finditer(bytes(pkg))}
+
+
+def detect_meter(pkg):
+    """Return the Detection of the meter sending pkg, or None."""
+    if pkg is None:
+        return None
+    found = scan_signatures(pkg)
+    if AIDON_SIGNATURE in found:
+        return Detection("aidon", CONFIDENCE_ID)
+    if found.intersection(AIDON_SE_SIGNATURES):
+        return Detection("aidon_se", CONFIDENCE_HEADER)
+    if KAIFA_SIGNATURE in found:
+        if field_type(fields=pkg[62:70], enc=chr) == KAIFA_MA304H4D:
+            return Detection("kaifa", CONFIDENCE_ID)
+        if KAIFA_SE_SIGNATURE in found:
+            return Detection("kaifa_se", CONFIDENCE_ID)
+        return Detection("kaifa", CONFIDENCE_VARIANT)
+    if KAMSTRUP_SIGNATURE in found:
+        return Detection("kamstrup", CONFIDENCE_ID)
+    return None
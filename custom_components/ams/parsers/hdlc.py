@@ -0,0 +1,201 @@
+"""
+HDLC framing for the HAN port.
+
+This module splits the raw byte stream from the meter into frames. Data is
+collected in one reusable bytearray and frame boundaries are located with
+bytearray.find, so the stream is never handled one byte at a time. The
+frame check sequence is computed while the frame is being received.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+
+from custom_components.ams.const import (DEC_FRAME_FLAG,
+                                         DEFAULT_TIMEOUT,
+                                         FRAME_ERROR_FLAG,
+                                         FRAME_ERROR_TIMEOUT)
+from custom_components.ams.parsers.crc import (CRC_INIT,
+                                               CRC_XOROUT,
+                                               crc16_x25_update)
+from custom_components.ams.stats import STAGE_READ
+from custom_components.ams.trace import HexDump
+
+_LOGGER = logging.getLogger(__name__)
+
+# FRAME_FLAG followed by the two frame format bytes holding the frame size.
+HEADER_SIZE = 3
+
+
+def frame_size(data):
+    """Frame size decoded from the frame format field, including flags."""
+    return ((data[1] & 0x0F) << 8 | data[2]) + 2
+
+
+class HdlcFrame(bytes):
+    """A received frame, fcs_valid tells if the frame check sequence holds."""
+
+    fcs_valid = None
+
+
+class HdlcFrameBuffer:
+    """Collect bytes from the meter and split them into frames."""
+
+    def __init__(self, oss=False, stats=None):
+        """Initialize the frame buffer.
+
+        stats is an optional PipelineStats counting discarded data.
+        """
+        self.oss = oss
+        self._stats = stats
+        self._buffer = bytearray()
+        self._frames = deque()
+        self._crc = CRC_INIT
+        self._crc_pos = 1
+
+    @property
+    def in_frame(self):
+        """Return True if a partial frame is buffered."""
+        return bool(self._buffer)
+
+    def feed(self, data):
+        """Add received bytes and split out complete frames."""
+        self._buffer += data
+        self._split()
+
+    def pop(self):
+        """Return the oldest complete frame, or None."""
+        if self._frames:
+            return self._frames.popleft()
+        return None
+
+    def frames(self):
+        """Yield the complete frames received so far."""
+        while self._frames:
+            yield self._frames.popleft()
+
+    def flush(self):
+        """Drop the partial frame, returns the dropped bytes."""
+        dropped = bytes(self._buffer)
+        self._buffer.clear()
+        self._reset_crc()
+        return dropped
+
+    def _reset_crc(self):
+        """Restart the frame check sequence for a new frame."""
+        self._crc = CRC_INIT
+        self._crc_pos = 1
+
+    def _split(self):
+        """Move every complete frame from the buffer to the frame queue."""
+        buf = self._buffer
+        while buf:
+            start = buf.find(DEC_FRAME_FLAG)
+            if start == -1:
+                # Purge data until FRAME_FLAG is received
+                if self._stats is not None:
+                    self._stats.discarded_bytes += len(buf)
+                buf.clear()
+                return
+            if start:
+                if self._stats is not None:
+                    self._stats.discarded_bytes += start
+                del buf[:start]
+                self._reset_crc()
+            if len(buf) < HEADER_SIZE:
+                return
+            if buf[1] == DEC_FRAME_FLAG:
+                # Closing flag of the previous frame directly followed by
+                # the opening flag of the next one.
+                del buf[0]
+                self._reset_crc()
+                continue
+            packet_size = frame_size(buf)
+            # The check sequence covers the frame between the opening flag
+            # and the two check sequence bytes before the closing flag.
+            fcs_pos = packet_size - 3
+            crc_stop = min(len(buf), fcs_pos)
+            if self._crc_pos < crc_stop:
+                self._crc = crc16_x25_update(
+                    self._crc, buf, self._crc_pos, crc_stop)
+                self._crc_pos = crc_stop
+            if len(buf) < packet_size:
+                return
+            if buf[packet_size - 1] == DEC_FRAME_FLAG or self.oss:
+                # Valid packet as last byte is FRAME_FLAG. OSS brikken
+                # does not always end the frame with FRAME_FLAG.
+                frame = HdlcFrame(buf[:packet_size])
+                frame.fcs_valid = (
+                    self._crc ^ CRC_XOROUT
+                    == buf[fcs_pos] | buf[fcs_pos + 1] << 8
+                )
+                self._frames.append(frame)
+            else:
+                if _LOGGER.isEnabledFor(logging.DEBUG):
+                    _LOGGER.debug(
+                        "Not a valid packet. Start over again. "
+                        "packet_size=%s, DUMP: %s",
+                        packet_size,
+                        HexDump(buf[:packet_size]),
+                    )
+                if self._stats is not None:
+                    self._stats.reject(FRAME_ERROR_FLAG)
+            del buf[:packet_size]
+            self._reset_crc()
+
+
+class HdlcProtocol(asyncio.Protocol):
+    """Asyncio protocol passing every received frame to a callback."""
+
+    def __init__(self, frame_callback, oss=False, timeout=DEFAULT_TIMEOUT,
+                 stats=None):
+        """Initialize the protocol.
+
+        A partial frame is dropped after timeout seconds without data, None
+        keeps it. stats is an optional PipelineStats.
+        """
+        self._frame_callback = frame_callback
+        self._stats = stats
+        self._frames = HdlcFrameBuffer(oss=oss, stats=stats)
+        self._timeout = timeout
+        self._last_data = 0.0
+        self.transport = None
+
+    def connection_made(self, transport):
+        """Store the transport when the connection is established."""
+        _LOGGER.debug("Connected to HAN port")
+        self.transport = transport
+
+    def data_received(self, data):
+        """Split received data into frames and hand them over."""
+        now = time.monotonic()
+        stats = self._stats
+        if (self._frames.in_frame and self._timeout is not None
+                and now - self._last_data > self._timeout):
+            _LOGGER.debug(
+                "Timeout waiting for end of packet. Flush "
+                " current packet. DUMP: %s",
+                HexDump(self._frames.flush()),
+            )
+            if stats is not None:
+                stats.reject(FRAME_ERROR_TIMEOUT)
+        self._last_data = now
+        if stats is None:
+            self._frames.feed(data)
+        else:
+            start = time.perf_counter_ns()
+            self._frames.feed(data)
+            stats.record(STAGE_READ, start)
+        for frame in self._frames.frames():
+            try:
+                self._frame_callback(frame)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Error handling frame: %s", frame)
+
+    def connection_lost(self, exc):
+        """Log when the connection to the HAN port is lost."""
+        if exc:
+            _LOGGER.warning("Connection to HAN port lost: %s", exc)
+        else:
+            _LOGGER.debug("Connection to HAN port closed")
+        self.transport = None
@@ -6,13 +6,39 @@ Kaifa does not use OBIS in their data, so real parsing is not possible.
 """
 import logging
 from datetime import datetime
-from crccheck.crc import CrcX25
-from custom_components.ams.parsers import byte_decode, field_type
+from custom_components.ams.parsers import as_bytes
+from custom_components.ams.parsers.crc import check_sequence, frame_check
+from custom_components.ams.parsers.layout import (
+    PACKET_SIZE,
+    Field,
+    Sensor,
+    Shift,
+    compile_fixed,
+    date_time,
+    meter_type_name,
+    text,
+    uint8,
+    uint32,
+    weekday,
+)
 from custom_components.ams.const import (
     ATTR_DEVICE_CLASS,
     ATTR_STATE_CLASS,
     DATA_FLAG,
     DEC_FRAME_FLAG,
+    DEVICE_CLASS_ENERGY,
+    FRAME_ERROR_DATA_FLAG,
+    FRAME_ERROR_FLAG,
+    FRAME_ERROR_FRAME_CRC,
+    FRAME_ERROR_HEADER_CRC,
+    FRAME_ERROR_SIZE,
+    HAN_ACTIVE_ENERGY_EXPORT,
+    HAN_ACTIVE_ENERGY_IMPORT,
+    HAN_ACTIVE_POWER_EXPORT,
+    HAN_ACTIVE_POWER_IMPORT,
+    HAN_CURRENT_L1,
+    HAN_CURRENT_L2,
+    HAN_CURRENT_L3,
     HAN_LIST_VER_ID,
     HAN_METER_DATETIME,
     HAN_METER_DAYOFWEEK,
@@ -20,467 +46,145 @@ from custom_components.ams.const import (
     HAN_METER_MANUFACTURER,
     HAN_METER_SERIAL,
     HAN_METER_TYPE,
-    HAN_PACKET_SIZE,
+    HAN_REACTIVE_ENERGY_EXPORT,
+    HAN_REACTIVE_ENERGY_IMPORT,
+    HAN_REACTIVE_POWER_EXPORT,
+    HAN_REACTIVE_POWER_IMPORT,
+    HAN_VOLTAGE_L1,
+    HAN_VOLTAGE_L2,
+    HAN_VOLTAGE_L3,
     LIST_TYPE_LONG_1PH,
     LIST_TYPE_LONG_3PH,
     LIST_TYPE_SHORT_1PH,
     LIST_TYPE_SHORT_3PH,
     LIST_TYPE_MINI,
-    METER_TYPE,
-    SENSOR_ATTR,
-    SENSOR_ICON,
-    SENSOR_STATE,
-    SENSOR_UOM,
-    UNKNOWN_METER,
-    WEEKDAY_MAPPING,
-)
-from homeassistant.components.sensor import (
-    SensorDeviceClass,
-    SensorStateClass
+    STATE_CLASS_TOTAL_INCREASING,
 )
 _LOGGER = logging.getLogger(__name__)
 
+ENERGY_ATTRS = (
+    (ATTR_STATE_CLASS, STATE_CLASS_TOTAL_INCREASING),
+    (ATTR_DEVICE_CLASS, DEVICE_CLASS_ENERGY),
+)
 
-# pylint: disable=too-many-locals, too-many-statements
-def parse_data(stored, data, swedish=False):
-    """Parse the incoming data to dict."""
-    sensor_data = {}
-    han_data = {}
-    pkt = data
-    read_packet_size = ((data[1] & 0x0F) << 8 | data[2]) + 2
-    han_data[HAN_PACKET_SIZE] = read_packet_size
-    date_time_year = byte_decode(fields=pkt[19:21], count=2)
-    date_time_month = pkt[21]
-    date_time_date = pkt[22]
-    han_data[HAN_METER_DAYOFWEEK] = WEEKDAY_MAPPING.get(pkt[23])
-    date_time_hour = str(pkt[24]).zfill(2)
-    date_time_minute = str(pkt[25]).zfill(2)
-    date_time_seconds = str(pkt[26]).zfill(2)
-    date_time_str = (
-        str(date_time_year)
-        + "-"
-        + str(date_time_month)
-        + "-"
-        + str(date_time_date)
-        + " "
-        + date_time_hour
-        + ":"
-        + date_time_minute
-        + ":"
-        + date_time_seconds
-    )
-    han_data["date_time"] = date_time_str
-    list_type = pkt[32]
-    han_data[HAN_METER_LIST_TYPE] = list_type
-    if list_type is LIST_TYPE_MINI or swedish:
-        if swedish:
-            han_data["active_power_p"] = byte_decode(fields=pkt[71:75])
-        else:
-            han_data["active_power_p"] = byte_decode(fields=pkt[34:38])
-        sensor_data["ams_active_power_import"] = {
-            SENSOR_STATE: han_data["active_power_p"],
-            SENSOR_ATTR: {
-                "timestamp": han_data["date_time"],
-                SENSOR_UOM: "W",
-                SENSOR_ICON: "mdi:gauge",
-            },
-        }
-        if not swedish:
-            stored.update(sensor_data)
-            return stored, han_data
-
-    han_data[HAN_LIST_VER_ID] = field_type(fields=pkt[35:42], enc=chr)
-    han_data[HAN_METER_SERIAL] = field_type(fields=pkt[44:60], enc=chr)
-    _LOGGER.debug("kaifa meter_type length is %s", pkt[61])
-    _offset = 0
-    if pkt[61] == 7:
-        _LOGGER.debug("set kaifa _offset to 1")
-        _offset = 1
-    han_data[HAN_METER_TYPE] = (
-        METER_TYPE.get(field_type(
-            fields=pkt[62:70 - _offset], enc=chr), UNKNOWN_METER)
+SENSORS = {
+    HAN_ACTIVE_POWER_IMPORT: Sensor("W", "mdi:gauge"),
+    HAN_ACTIVE_POWER_EXPORT: Sensor("W", "mdi:gauge"),
+    HAN_REACTIVE_POWER_IMPORT: Sensor("VAr", "mdi:gauge"),
+    HAN_REACTIVE_POWER_EXPORT: Sensor("VAr", "mdi:gauge"),
+    HAN_CURRENT_L1: Sensor("A", "mdi:current-ac"),
+    HAN_CURRENT_L2: Sensor("A", "mdi:current-ac"),
+    HAN_CURRENT_L3: Sensor("A", "mdi:current-ac"),
+    HAN_VOLTAGE_L1: Sensor("V", "mdi:flash"),
+    HAN_VOLTAGE_L2: Sensor("V", "mdi:flash"),
+    HAN_VOLTAGE_L3: Sensor("V", "mdi:flash"),
+    HAN_ACTIVE_ENERGY_IMPORT: Sensor("kWh", "mdi:gauge", ENERGY_ATTRS),
+    HAN_ACTIVE_ENERGY_EXPORT: Sensor("kWh", "mdi:gauge", ENERGY_ATTRS),
+    HAN_REACTIVE_ENERGY_IMPORT: Sensor("kVArh", "mdi:gauge", ENERGY_ATTRS),
+    HAN_REACTIVE_ENERGY_EXPORT: Sensor("kVArh", "mdi:gauge", ENERGY_ATTRS),
+}
+
+HEADER = (
+    PACKET_SIZE,
+    Field("date_time", 19, 27, date_time),
+    Field(HAN_METER_DAYOFWEEK, 23, 24, weekday),
+    Field(HAN_METER_LIST_TYPE, 32, 33, uint8),
+)
+MINI = (
+    Field("active_power_p", 34, 38, uint32, None, HAN_ACTIVE_POWER_IMPORT),
+)
+# Positions with a meter type of 8 characters, see TYPE_SHIFT
+BASE = (
+    Field(HAN_LIST_VER_ID, 35, 42, text),
+    Field(HAN_METER_SERIAL, 44, 60, text),
+    Field(HAN_METER_TYPE, 62, 70, meter_type_name),
+    Field("active_power_p", 71, 75, uint32, None, HAN_ACTIVE_POWER_IMPORT),
+    Field("active_power_n", 76, 80, uint32, 100, HAN_ACTIVE_POWER_EXPORT),
+    Field("reactive_power_p", 81, 85, uint32, None,
+          HAN_REACTIVE_POWER_IMPORT),
+    Field("reactive_power_n", 86, 90, uint32, None,
+          HAN_REACTIVE_POWER_EXPORT),
+    Field("current_l1", 91, 95, uint32, 1000, HAN_CURRENT_L1),
+)
+SHORT_3PH = BASE + (
+    Field("current_l2", 96, 100, uint32, 1000, HAN_CURRENT_L2),
+    Field("current_l3", 101, 105, uint32, 1000, HAN_CURRENT_L3),
+    Field("voltage_l1", 106, 110, uint32, 10, HAN_VOLTAGE_L1),
+    Field("voltage_l2", 111, 115, uint32, 10, HAN_VOLTAGE_L2),
+    Field("voltage_l3", 116, 120, uint32, 10, HAN_VOLTAGE_L3),
+)
+LONG_3PH = SHORT_3PH + (
+    Field(HAN_METER_DATETIME, 122, 130, date_time),
+    Field(HAN_METER_DAYOFWEEK, 126, 127, weekday),
+    Field("active_energy_p", 135, 139, uint32, 1000,
+          HAN_ACTIVE_ENERGY_IMPORT),
+    Field("active_energy_n", 140, 144, uint32, 1000,
+          HAN_ACTIVE_ENERGY_EXPORT),
+    Field("reactive_energy_p", 145, 149, uint32, 1000,
+          HAN_REACTIVE_ENERGY_IMPORT),
+    Field("reactive_energy_n", 150, 154, uint32, 1000,
+          HAN_REACTIVE_ENERGY_EXPORT),
+)
+SHORT_1PH = BASE + (
+    Field("voltage_l1", 96, 100, uint32, 10, HAN_VOLTAGE_L1),
+)
+LONG_1PH = SHORT_1PH + (
+    Field(HAN_METER_DATETIME, 102, 110, date_time),
+    Field(HAN_METER_DAYOFWEEK, 106, 107, weekday),
+    Field("active_energy_p", 115, 119, uint32, 1000,
+          HAN_ACTIVE_ENERGY_IMPORT),
+    Field("active_energy_n", 120, 124, uint32, 1000,
+          HAN_ACTIVE_ENERGY_EXPORT),
+    Field("reactive_energy_p", 125, 129, uint32, 1000,
+          HAN_REACTIVE_ENERGY_IMPORT),
+    Field("reactive_energy_n", 130, 134, uint32, 1000,
+          HAN_REACTIVE_ENERGY_EXPORT),
+)
+LISTS = {
+    LIST_TYPE_MINI: MINI,
+    LIST_TYPE_SHORT_1PH: SHORT_1PH,
+    LIST_TYPE_LONG_1PH: LONG_1PH,
+    LIST_TYPE_SHORT_3PH: SHORT_3PH,
+    LIST_TYPE_LONG_3PH: LONG_3PH,
+}
+# A meter type of 7 characters moves the fields after it one byte back
+TYPE_SHIFT = Shift(61, 7, 70, -1)
+
+
+def identity(han_data):
+    """Return the meter attributes of the sensors."""
+    return (
+        (HAN_METER_MANUFACTURER, han_data[HAN_LIST_VER_ID].title()),
+        (HAN_METER_TYPE, han_data[HAN_METER_TYPE]),
+        (HAN_METER_SERIAL, han_data[HAN_METER_SERIAL]),
     )
-    han_data["active_power_p"] = byte_decode(
-        fields=pkt[71 - _offset:75 - _offset])
-    sensor_data["ams_active_power_import"] = {
-        SENSOR_STATE: han_data["active_power_p"],
-        SENSOR_ATTR: {
-            "timestamp": han_data["date_time"],
-            HAN_METER_MANUFACTURER: han_data[
-                HAN_LIST_VER_ID].title(),
-            HAN_METER_TYPE: han_data[HAN_METER_TYPE],
-            HAN_METER_SERIAL: han_data[HAN_METER_SERIAL],
-            SENSOR_UOM: "W",
-            SENSOR_ICON: "mdi:gauge",
-        },
-    }
-    han_data["active_power_n"] = byte_decode(
-        fields=pkt[76 - _offset:80 - _offset]) / 100
-    sensor_data["ams_active_power_export"] = {
-        SENSOR_STATE: han_data["active_power_n"],
-        SENSOR_ATTR: {
-            "timestamp": han_data["date_time"],
-            HAN_METER_MANUFACTURER: han_data[
-                HAN_LIST_VER_ID].title(),
-            HAN_METER_TYPE: han_data[HAN_METER_TYPE],
-            HAN_METER_SERIAL: han_data[HAN_METER_SERIAL],
-            SENSOR_UOM: "W",
-            SENSOR_ICON: "mdi:gauge",
-        },
-    }
-    han_data["reactive_power_p"] = byte_decode(
-        fields=pkt[81 - _offset:85 - _offset])
-    sensor_data["ams_reactive_power_import"] = {
-        SENSOR_STATE: han_data["reactive_power_p"],
-        SENSOR_ATTR: {
-            "timestamp": han_data["date_time"],
-            HAN_METER_MANUFACTURER: han_data[
-                HAN_LIST_VER_ID].title(),
-            HAN_METER_TYPE: han_data[HAN_METER_TYPE],
-            HAN_METER_SERIAL: han_data[HAN_METER_SERIAL],
-            SENSOR_UOM: "VAr",
-            SENSOR_ICON: "mdi:gauge",
-        },
-    }
-    han_data["reactive_power_n"] = byte_decode(
-        fields=pkt[86 - _offset:90 - _offset])
-    sensor_data["ams_reactive_power_export"] = {
-        SENSOR_STATE: han_data["reactive_power_n"],
-        SENSOR_ATTR: {
-            "timestamp": han_data["date_time"],
-            HAN_METER_MANUFACTURER: han_data[
-                HAN_LIST_VER_ID].title(),
-            HAN_METER_TYPE: han_data[HAN_METER_TYPE],
-            HAN_METER_SERIAL: han_data[HAN_METER_SERIAL],
-            SENSOR_UOM: "VAr",
-            SENSOR_ICON: "mdi:gauge",
-        },
-    }
-    han_data["current_l1"] = byte_decode(
-        fields=pkt[91 - _offset:95 - _offset]) / 1000
-    sensor_data["ams_current_l1"] = {
-        SENSOR_STATE: han_data["current_l1"],
-        SENSOR_ATTR: {
-            "timestamp": han_data["date_time"],
-            HAN_METER_MANUFACTURER: han_data[
-                HAN_LIST_VER_ID].title(),
-            HAN_METER_TYPE: han_data[HAN_METER_TYPE],
-            HAN_METER_SERIAL: han_data[HAN_METER_SERIAL],
-            SENSOR_UOM: "A",
-            SENSOR_ICON: "mdi:current-ac",
-        },
-    }
 
-    if (list_type is LIST_TYPE_SHORT_3PH or
-            list_type is LIST_TYPE_LONG_3PH):
-        han_data["current_l2"] = byte_decode(
-            fields=pkt[96 - _offset:100 - _offset]) / 1000
-        sensor_data["ams_current_l2"] = {
-            SENSOR_STATE: han_data["current_l2"],
-            SENSOR_ATTR: {
-                "timestamp": han_data["date_time"],
-                HAN_METER_MANUFACTURER: han_data[
-                    HAN_LIST_VER_ID].title(),
-                HAN_METER_TYPE: han_data[HAN_METER_TYPE],
-                HAN_METER_SERIAL: han_data[HAN_METER_SERIAL],
-                SENSOR_UOM: "A",
-                SENSOR_ICON: "mdi:current-ac",
-            },
-        }
-        han_data["current_l3"] = byte_decode(
-            fields=pkt[101 - _offset:105 - _offset]) / 1000
-        sensor_data["ams_current_l3"] = {
-            SENSOR_STATE: han_data["current_l3"],
-            SENSOR_ATTR: {
-                "timestamp": han_data["date_time"],
-                HAN_METER_MANUFACTURER: han_data[
-                    HAN_LIST_VER_ID].title(),
-                HAN_METER_TYPE: han_data[HAN_METER_TYPE],
-                HAN_METER_SERIAL: han_data[HAN_METER_SERIAL],
-                SENSOR_UOM: "A",
-                SENSOR_ICON: "mdi:current-ac",
-            },
-        }
-        han_data["voltage_l1"] = byte_decode(
-            fields=pkt[106 - _offset:110 - _offset]) / 10
-        sensor_data["ams_voltage_l1"] = {
-            SENSOR_STATE: han_data["voltage_l1"],
-            SENSOR_ATTR: {
-                "timestamp": han_data["date_time"],
-                HAN_METER_MANUFACTURER: han_data[
-                    HAN_LIST_VER_ID].title(),
-                HAN_METER_TYPE: han_data[HAN_METER_TYPE],
-                HAN_METER_SERIAL: han_data[HAN_METER_SERIAL],
-                SENSOR_UOM: "V",
-                SENSOR_ICON: "mdi:flash",
-            },
-        }
-        han_data["voltage_l2"] = byte_decode(
-            fields=pkt[111 - _offset:115 - _offset]) / 10
-        sensor_data["ams_voltage_l2"] = {
-            SENSOR_STATE: han_data["voltage_l2"],
-            SENSOR_ATTR: {
-                "timestamp": han_data["date_time"],
-                HAN_METER_MANUFACTURER: han_data[
-                    HAN_LIST_VER_ID].title(),
-                HAN_METER_TYPE: han_data[HAN_METER_TYPE],
-                HAN_METER_SERIAL: han_data[HAN_METER_SERIAL],
-                SENSOR_UOM: "V",
-                SENSOR_ICON: "mdi:flash",
-            },
-        }
-        han_data["voltage_l3"] = byte_decode(
-            fields=pkt[116 - _offset:120 - _offset]) / 10
-        sensor_data["ams_voltage_l3"] = {
-            SENSOR_STATE: han_data["voltage_l3"],
-            SENSOR_ATTR: {
-                "timestamp": han_data["date_time"],
-                HAN_METER_MANUFACTURER: han_data[
-                    HAN_LIST_VER_ID].title(),
-                HAN_METER_TYPE: han_data[HAN_METER_TYPE],
-                HAN_METER_SERIAL: han_data[HAN_METER_SERIAL],
-                SENSOR_UOM: "V",
-                SENSOR_ICON: "mdi:flash",
-            },
-        }
-        if list_type == LIST_TYPE_LONG_3PH:
-            meter_date_time_year = byte_decode(
-                fields=pkt[122 - _offset:124 - _offset], count=2)
-            meter_date_time_month = pkt[124 - _offset]
-            meter_date_time_date = pkt[125 - _offset]
-            han_data[HAN_METER_DAYOFWEEK] = WEEKDAY_MAPPING.get(
-                pkt[126 - _offset])
-            meter_date_time_hour = str(pkt[127 - _offset]).zfill(2)
-            meter_date_time_minute = str(pkt[128 - _offset]).zfill(2)
-            meter_date_time_seconds = str(pkt[129 - _offset]).zfill(2)
-            han_data[HAN_METER_DATETIME] = (
-                str(meter_date_time_year)
-                + "-"
-                + str(meter_date_time_month)
-                + "-"
-                + str(meter_date_time_date)
-                + " "
-                + meter_date_time_hour
-                + ":"
-                + meter_date_time_minute
-                + ":"
-                + meter_date_time_seconds
-            )
-            han_data["active_energy_p"] = (
-                byte_decode(fields=pkt[135 - _offset:139 - _offset]) / 1000
-            )
-            sensor_data["ams_active_energy_import"] = {
-                SENSOR_STATE: han_data["active_energy_p"],
-                SENSOR_ATTR: {
-                    "timestamp": han_data["date_time"],
-                    HAN_METER_DATETIME: han_data[
-                        HAN_METER_DATETIME],
-                    HAN_METER_MANUFACTURER: (
-                        han_data[HAN_LIST_VER_ID].title()
-                    ),
-                    HAN_METER_TYPE: han_data[HAN_METER_TYPE],
-                    HAN_METER_SERIAL: han_data[HAN_METER_SERIAL],
-                    SENSOR_UOM: "kWh",
-                    SENSOR_ICON: "mdi:gauge",
-                    ATTR_STATE_CLASS: SensorStateClass.TOTAL_INCREASING,
-                    ATTR_DEVICE_CLASS: SensorDeviceClass.ENERGY,
-                },
-            }
-            han_data["active_energy_n"] = (
-                byte_decode(fields=pkt[140 - _offset:144 - _offset]) / 1000
-            )
-            sensor_data["ams_active_energy_export"] = {
-                SENSOR_STATE: han_data["active_energy_n"],
-                SENSOR_ATTR: {
-                    "timestamp": han_data["date_time"],
-                    HAN_METER_DATETIME: han_data[
-                        HAN_METER_DATETIME],
-                    HAN_METER_MANUFACTURER: (
-                        han_data[HAN_LIST_VER_ID].title()
-                    ),
-                    HAN_METER_TYPE: han_data[HAN_METER_TYPE],
-                    HAN_METER_SERIAL: han_data[HAN_METER_SERIAL],
-                    SENSOR_UOM: "kWh",
-                    SENSOR_ICON: "mdi:gauge",
-                    ATTR_STATE_CLASS: SensorStateClass.TOTAL_INCREASING,
-                    ATTR_DEVICE_CLASS: SensorDeviceClass.ENERGY,
-                },
-            }
-            han_data["reactive_energy_p"] = (
-                byte_decode(fields=pkt[145 - _offset:149 - _offset]) / 1000
-            )
-            sensor_data["ams_reactive_energy_import"] = {
-                SENSOR_STATE: han_data["reactive_energy_p"],
-                SENSOR_ATTR: {
-                    "timestamp": han_data["date_time"],
-                    HAN_METER_DATETIME: han_data[
-                        HAN_METER_DATETIME],
-                    HAN_METER_MANUFACTURER: (
-                        han_data[HAN_LIST_VER_ID].title()
-                    ),
-                    HAN_METER_TYPE: han_data[HAN_METER_TYPE],
-                    HAN_METER_SERIAL: han_data[HAN_METER_SERIAL],
-                    SENSOR_UOM: "kVArh",
-                    SENSOR_ICON: "mdi:gauge",
-                    ATTR_STATE_CLASS: SensorStateClass.TOTAL_INCREASING,
-                    ATTR_DEVICE_CLASS: SensorDeviceClass.ENERGY,
-                },
-            }
-            han_data["reactive_energy_n"] = (
-                byte_decode(fields=pkt[150 - _offset:154 - _offset]) / 1000
-            )
-            sensor_data["ams_reactive_energy_export"] = {
-                SENSOR_STATE: han_data["reactive_energy_n"],
-                SENSOR_ATTR: {
-                    "timestamp": han_data["date_time"],
-                    HAN_METER_DATETIME: han_data[
-                        HAN_METER_DATETIME],
-                    HAN_METER_MANUFACTURER: (
-                        han_data[HAN_LIST_VER_ID].title()
-                    ),
-                    HAN_METER_TYPE: han_data[HAN_METER_TYPE],
-                    HAN_METER_SERIAL: han_data[HAN_METER_SERIAL],
-                    SENSOR_UOM: "kVArh",
-                    SENSOR_ICON: "mdi:gauge",
-                    ATTR_STATE_CLASS: SensorStateClass.TOTAL_INCREASING,
-                    ATTR_DEVICE_CLASS: SensorDeviceClass.ENERGY,
-                },
-            }
 
-    if (list_type is LIST_TYPE_SHORT_1PH or
-            list_type is LIST_TYPE_LONG_1PH):
+_decode = compile_fixed(HEADER, LISTS, BASE, SENSORS, TYPE_SHIFT,
+                        "date_time", identity)
+# The Swedish lists carry the full identity, even the mini list
+_decode_swedish = compile_fixed(HEADER, {**LISTS, LIST_TYPE_MINI: BASE},
+                                BASE, SENSORS, TYPE_SHIFT, "date_time",
+                                identity)
 
-        han_data["voltage_l1"] = byte_decode(
-            fields=pkt[96 - _offset:100 - _offset]) / 10
-        sensor_data["ams_voltage_l1"] = {
-            SENSOR_STATE: han_data["voltage_l1"],
-            SENSOR_ATTR: {
-                "timestamp": han_data["date_time"],
-                HAN_METER_MANUFACTURER: han_data[
-                    HAN_LIST_VER_ID].title(),
-                HAN_METER_TYPE: han_data[HAN_METER_TYPE],
-                HAN_METER_SERIAL: han_data[HAN_METER_SERIAL],
-                SENSOR_UOM: "V",
-                SENSOR_ICON: "mdi:flash",
-            },
-        }
 
-        if list_type == LIST_TYPE_LONG_1PH:
-            meter_date_time_year = byte_decode(
-                fields=pkt[102 - _offset:104 - _offset], count=2)
-            meter_date_time_month = pkt[104 - _offset]
-            meter_date_time_date = pkt[105 - _offset]
-            han_data[HAN_METER_DAYOFWEEK] = WEEKDAY_MAPPING.get(
-                pkt[106 - _offset])
-            meter_date_time_hour = str(pkt[107 - _offset]).zfill(2)
-            meter_date_time_minute = str(pkt[108 - _offset]).zfill(2)
-            meter_date_time_seconds = str(pkt[109 - _offset]).zfill(2)
-            han_data[HAN_METER_DATETIME] = (
-                str(meter_date_time_year)
-                + "-"
-                + str(meter_date_time_month)
-                + "-"
-                + str(meter_date_time_date)
-                + " "
-                + meter_date_time_hour
-                + ":"
-                + meter_date_time_minute
-                + ":"
-                + meter_date_time_seconds
-            )
-            han_data["active_energy_p"] = (
-                byte_decode(fields=pkt[115 - _offset:119 - _offset]) / 1000
-            )
-            sensor_data["ams_active_energy_import"] = {
-                SENSOR_STATE: han_data["active_energy_p"],
-                SENSOR_ATTR: {
-                    "timestamp": han_data["date_time"],
-                    HAN_METER_DATETIME: han_data[
-                        HAN_METER_DATETIME],
-                    HAN_METER_MANUFACTURER: (
-                        han_data[HAN_LIST_VER_ID].title()
-                    ),
-                    HAN_METER_TYPE: han_data[HAN_METER_TYPE],
-                    HAN_METER_SERIAL: han_data[HAN_METER_SERIAL],
-                    SENSOR_UOM: "kWh",
-                    SENSOR_ICON: "mdi:gauge",
-                    ATTR_STATE_CLASS: SensorStateClass.TOTAL_INCREASING,
-                    ATTR_DEVICE_CLASS: SensorDeviceClass.ENERGY,
-                },
-            }
-            han_data["active_energy_n"] = (
-                byte_decode(fields=pkt[120 - _offset:124 - _offset]) / 1000
-            )
-            sensor_data["ams_active_energy_export"] = {
-                SENSOR_STATE: han_data["active_energy_n"],
-                SENSOR_ATTR: {
-                    "timestamp": han_data["date_time"],
-                    HAN_METER_DATETIME: han_data[
-                        HAN_METER_DATETIME],
-                    HAN_METER_MANUFACTURER: (
-                        han_data[HAN_LIST_VER_ID].title()
-                    ),
-                    HAN_METER_TYPE: han_data[HAN_METER_TYPE],
-                    HAN_METER_SERIAL: han_data[HAN_METER_SERIAL],
-                    SENSOR_UOM: "kWh",
-                    SENSOR_ICON: "mdi:gauge",
-                    ATTR_STATE_CLASS: SensorStateClass.TOTAL_INCREASING,
-                    ATTR_DEVICE_CLASS: SensorDeviceClass.ENERGY,
-                },
-            }
-            han_data["reactive_energy_p"] = (
-                byte_decode(fields=pkt[125 - _offset:129 - _offset]) / 1000
-            )
-            sensor_data["ams_reactive_energy_import"] = {
-                SENSOR_STATE: han_data["reactive_energy_p"],
-                SENSOR_ATTR: {
-                    "timestamp": han_data["date_time"],
-                    HAN_METER_DATETIME: han_data[
-                        HAN_METER_DATETIME],
-                    HAN_METER_MANUFACTURER: (
-                        han_data[HAN_LIST_VER_ID].title()
-                    ),
-                    HAN_METER_TYPE: han_data[HAN_METER_TYPE],
-                    HAN_METER_SERIAL: han_data[HAN_METER_SERIAL],
-                    SENSOR_UOM: "kVArh",
-                    SENSOR_ICON: "mdi:gauge",
-                    ATTR_STATE_CLASS: SensorStateClass.TOTAL_INCREASING,
-                    ATTR_DEVICE_CLASS: SensorDeviceClass.ENERGY,
-                },
-            }
-            han_data["reactive_energy_n"] = (
-                byte_decode(fields=pkt[130 - _offset:134 - _offset]) / 1000
-            )
-            sensor_data["ams_reactive_energy_export"] = {
-                SENSOR_STATE: han_data["reactive_energy_n"],
-                SENSOR_ATTR: {
-                    "timestamp": han_data["date_time"],
-                    HAN_METER_DATETIME: han_data[
-                        HAN_METER_DATETIME],
-                    HAN_METER_MANUFACTURER: (
-                        han_data[HAN_LIST_VER_ID].title()
-                    ),
-                    HAN_METER_TYPE: han_data[HAN_METER_TYPE],
-                    HAN_METER_SERIAL: han_data[HAN_METER_SERIAL],
-                    SENSOR_UOM: "kVArh",
-                    SENSOR_ICON: "mdi:gauge",
-                    ATTR_STATE_CLASS: SensorStateClass.TOTAL_INCREASING,
-                    ATTR_DEVICE_CLASS: SensorDeviceClass.ENERGY,
-                },
-            }
-    stored.update(sensor_data)
-    return stored, han_data
+def parse_data(stored, data, swedish=False):
+    """Parse the incoming data to dict."""
+    if swedish:
+        return _decode_swedish(stored, data)
+    return _decode(stored, data)
 
 
-def test_valid_data(data, oss):
-    """Test the incoming data for validity."""
+def frame_error(data, oss):
+    """Return why the incoming data is invalid, None if it is valid."""
     # pylint: disable=too-many-return-statements
     if data is None:
-        return False
+        return FRAME_ERROR_SIZE
 
+    data = as_bytes(data)
     if len(data) > 287 or len(data) < 41:
         _LOGGER.debug("Invalid packet size %s", len(data))
-        return False
+        return FRAME_ERROR_SIZE
 
     packet_size = len(data)
     read_packet_size = ((data[1] & 0x0F) << 8 | data[2]) + 2
@@ -491,7 +195,7 @@ def test_valid_data(data, oss):
             packet_size,
             read_packet_size,
         )
-        return False
+        return FRAME_ERROR_SIZE
 
     if not data[0] == DEC_FRAME_FLAG and data[-1] == DEC_FRAME_FLAG:
         _LOGGER.debug(
@@ -500,25 +204,24 @@ def test_valid_data(data, oss):
             len(data),
             False,
         )
-        return False
+        return FRAME_ERROR_FLAG
 
     if data[9:13] != DATA_FLAG:
         _LOGGER.debug("Data does not start with %s: %s", DATA_FLAG,
                       data[9:13])
-        return False
+        return FRAME_ERROR_DATA_FLAG
 
-    header_checksum = CrcX25.calc(bytes(data[1:7]))
-    read_header_checksum = data[8] << 8 | data[7]
-
-    if header_checksum != read_header_checksum:
+    if not check_sequence(data, 1, 7):
         _LOGGER.debug("Invalid header CRC check")
-        return False
-
-    frame_checksum = CrcX25.calc(bytes(data[1:-3]))
-    read_frame_checksum = data[-2] << 8 | data[-3]
+        return FRAME_ERROR_HEADER_CRC
 
-    if frame_checksum != read_frame_checksum:
+    if not frame_check(data):
         _LOGGER.debug("Invalid frame CRC check")
-        return False
+        return FRAME_ERROR_FRAME_CRC
+
+    return None
 
-    return True
+
+def test_valid_data(data, oss):
+    """Test the incoming data for validity."""
+    return frame_error(data, oss) is None
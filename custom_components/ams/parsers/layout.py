@@ -0,0 +1,367 @@
+"""
+Declarative layouts of the meter lists.
+
+A meter list is described as data: fields at fixed positions of the packet,
+or sensors found by their OBIS code, each with a value type and a scale.
+compile_fixed() and compile_obis() turn a layout into a decoder function,
+decoder(stored, pkt) -> (stored, han_data), with the positions, value
+decoders, scales and sensor attributes resolved at import. Decoding a frame
+is a loop over precomputed tuples, and a new meter variant is a new layout.
+"""
+import logging
+import struct
+from collections import namedtuple
+
+from custom_components.ams.const import (
+    ATTR_DEVICE_CLASS,
+    ATTR_STATE_CLASS,
+    HAN_LIST_VER_ID,
+    HAN_METER_DATETIME,
+    HAN_METER_LIST_TYPE,
+    HAN_METER_MANUFACTURER,
+    HAN_METER_SERIAL,
+    HAN_METER_TYPE,
+    HAN_OBIS_CODE,
+    HAN_OBIS_DATETIME,
+    HAN_PACKET_SIZE,
+    HOURLY_SENSORS,
+    METER_TYPE,
+    OBIS_REGISTRY,
+    SENSOR_OBIS_MAP,
+    UNKNOWN_METER,
+    WEEKDAY_MAPPING,
+)
+from custom_components.ams.parsers import (as_bytes,
+                                           obis_index,
+                                           obis_walk)
+from custom_components.ams.parsers.records import sensor_record
+
+_LOGGER = logging.getLogger(__name__)
+
+# DLMS data type tags following an OBIS code
+TAG_DOUBLE_LONG_UNSIGNED = 6
+TAG_OCTET_STRING = 9
+TAG_VISIBLE_STRING = 10
+# Aidon tags some strings 13, with one more byte before the length
+TAG_STRING_13 = 13
+TAG_LONG = 16
+TAG_LONG_UNSIGNED = 18
+
+# han_data name, position of the first byte and the byte after the field,
+# decoder(pkt, start, stop) of the bytes of the packet buffer, divisor of
+# the value and sensor key
+Field = namedtuple("Field", ["name", "start", "stop", "decode", "scale",
+                             "key"], defaults=(None, None))
+# Unit, icon and extra attributes of a sensor in a fixed layout
+Sensor = namedtuple("Sensor", ["unit", "icon", "extra"], defaults=((),))
+# Decoder and size of the value after an OBIS type tag. scale is a divisor,
+# or a dict of divisors by sensor key, sensors not in it are not scaled.
+ValueType = namedtuple("ValueType", ["decode", "size", "scale"],
+                       defaults=(None,))
+# When the byte at position is value, the fields from at on move by by
+Shift = namedtuple("Shift", ["position", "value", "at", "by"])
+
+_FixedList = namedtuple("_FixedList", ["fields", "shifted", "identified"])
+_FixedField = namedtuple("_FixedField", [
+    "name", "start", "stop", "decode", "scale", "key", "unit", "icon",
+    "extra", "dated"])
+_ObisIdentity = namedtuple("_ObisIdentity", [
+    "name", "obis", "double", "decode", "length"])
+_ObisValue = namedtuple("_ObisValue", [
+    "name", "obis", "decode", "size", "scale", "unit", "icon",
+    "extra", "dated"])
+
+_UINT16 = struct.Struct(">H").unpack_from
+_UINT32 = struct.Struct(">I").unpack_from
+_INT16 = struct.Struct(">h").unpack_from
+
+
+def uint8(pkt, start, _stop):
+    """Decode an unsigned byte."""
+    return pkt[start]
+
+
+def uint16(pkt, start, _stop):
+    """Decode an unsigned 16 bit value."""
+    return _UINT16(pkt, start)[0]
+
+
+def uint32(pkt, start, _stop):
+    """Decode an unsigned 32 bit value."""
+    return _UINT32(pkt, start)[0]
+
+
+def int16(pkt, start, _stop):
+    """Decode a signed 16 bit value."""
+    return _INT16(pkt, start)[0]
+
+
+def text(pkt, start, stop):
+    """Decode a string, one character per byte."""
+    return pkt[start:stop].decode("latin-1")
+
+
+def frame_size(pkt, start, _stop):
+    """Decode the frame size from the frame format field."""
+    return ((pkt[start] & 0x0F) << 8 | pkt[start + 1]) + 2
+
+
+def weekday(pkt, start, _stop):
+    """Decode the day of week."""
+    return WEEKDAY_MAPPING.get(pkt[start])
+
+
+def meter_type_name(pkt, start, stop):
+    """Decode a meter type sent as its name."""
+    return METER_TYPE.get(text(pkt, start, stop), UNKNOWN_METER)
+
+
+def meter_type_number(pkt, start, stop):
+    """Decode a meter type sent as its number."""
+    return METER_TYPE.get(int(text(pkt, start, stop)), UNKNOWN_METER)
+
+
+def date_time(pkt, start, _stop):
+    """Decode a date and time to year-month-date hh:mm:ss."""
+    return (f"{pkt[start] << 8 | pkt[start + 1]}-{pkt[start + 2]}-"
+            f"{pkt[start + 3]} {pkt[start + 5]:02d}:{pkt[start + 6]:02d}:"
+            f"{pkt[start + 7]:02d}")
+
+
+def obis_date_time(pkt, start, _stop):
+    """Decode an OBIS date and time, in the format of the OBIS meters."""
+    return (f"{pkt[start] << 8 | pkt[start + 1]}-{pkt[start + 2]}-"
+            f"{pkt[start + 3]}-{pkt[start + 5]:02d}-{pkt[start + 6]:02d}-"
+            f"{pkt[start + 6]:02d}-{pkt[start + 7]:02d}")
+
+
+PACKET_SIZE = Field(HAN_PACKET_SIZE, 1, 3, frame_size)
+
+
+def meter_identity(han_data):
+    """Return the meter attributes of the sensors."""
+    return (
+        (HAN_METER_MANUFACTURER, han_data[HAN_LIST_VER_ID]),
+        (HAN_METER_TYPE, han_data[HAN_METER_TYPE]),
+        (HAN_METER_SERIAL, han_data[HAN_METER_SERIAL]),
+    )
+
+
+def _decode_fields(fields, pkt, han_data):
+    """Decode fields without sensors into han_data."""
+    for name, start, stop, decode, scale, _ in fields:
+        value = decode(pkt, start, stop)
+        han_data[name] = value / scale if scale else value
+
+
+def _shifted(fields, shift):
+    """Return the fields with the positions from shift.at moved."""
+    def move(position):
+        if position >= shift.at:
+            return position + shift.by
+        return position
+    return tuple(field._replace(start=move(field.start),
+                                stop=move(field.stop))
+                 for field in fields)
+
+
+def _fixed_list(fields, sensors, shift):
+    """Resolve the fields of one list."""
+    resolved = []
+    for field in fields:
+        sensor = sensors[field.key] if field.key else Sensor(None, None)
+        resolved.append(_FixedField(
+            field.name, field.start, field.stop, field.decode, field.scale,
+            field.key, sensor.unit, sensor.icon, sensor.extra,
+            field.key in HOURLY_SENSORS))
+    resolved = tuple(resolved)
+    shifted = None
+    if shift is not None and any(field.stop >= shift.at
+                                 for field in resolved):
+        shifted = _shifted(resolved, shift)
+    return _FixedList(resolved, shifted,
+                      any(field.name == HAN_METER_SERIAL for field in fields))
+
+
+# pylint: disable=too-many-arguments
+def compile_fixed(header, lists, default, sensors, shift=None,
+                  timestamp=None, identity=meter_identity):
+    """Compile a layout of fields at fixed positions into a decoder.
+
+    header fields are decoded from every frame, the fields of lists by list
+    type, default for unknown list types. sensors maps the sensor keys to
+    their Sensor. The sensors of a list with the meter serial get the meter
+    identity as attributes, the energy sensors the meter date and time.
+    timestamp names the han_data field stamped on the sensors.
+    """
+    compiled = {list_type: _fixed_list(fields, sensors, shift)
+                for list_type, fields in lists.items()}
+    fallback = _fixed_list(default, sensors, shift)
+
+    def decode(stored, pkt):
+        """Decode a frame, updating stored with the sensors."""
+        pkt = as_bytes(pkt)
+        han_data = {}
+        _decode_fields(header, pkt, han_data)
+        layout = compiled.get(han_data[HAN_METER_LIST_TYPE], fallback)
+        fields = layout.fields
+        if (layout.shifted is not None
+                and pkt[shift.position] == shift.value):
+            fields = layout.shifted
+        stamp = han_data[timestamp] if timestamp else None
+        attrs = None
+        sensor_data = {}
+        for (name, start, stop, decode_value, scale, key, unit, icon, extra,
+             dated) in fields:
+            value = decode_value(pkt, start, stop)
+            if scale:
+                value = value / scale
+            han_data[name] = value
+            if key is None:
+                continue
+            if layout.identified and attrs is None:
+                attrs = identity(han_data)
+            meta = attrs or ()
+            if dated:
+                meta = ((HAN_METER_DATETIME, han_data[HAN_METER_DATETIME]),
+                        ) + meta
+            sensor_data[key] = sensor_record(key, value, stamp, unit, icon,
+                                             meta, extra)
+        stored.update(sensor_data)
+        return stored, han_data
+
+    return decode
+
+
+def _obis_codes(obis_map):
+    """Yield the key, code and whether the key has two codes."""
+    for key, codes in obis_map.items():
+        double = isinstance(codes[0], list)
+        for code in codes if double else [codes]:
+            yield key, bytes(code), double
+
+
+def _scale(scale, key):
+    """Return the divisor of the values of a sensor."""
+    if isinstance(scale, dict):
+        return scale.get(key)
+    return scale
+
+
+def _obis_values(values, singles):
+    """Resolve the value types of every sensor code."""
+    resolved = {}
+    for key, code, double in _obis_codes(SENSOR_OBIS_MAP):
+        record = OBIS_REGISTRY[code]
+        extra = ((HAN_OBIS_CODE, record.obis),)
+        if record.device_class is not None:
+            extra += ((ATTR_DEVICE_CLASS, record.device_class),)
+        if record.state_class is not None:
+            extra += ((ATTR_STATE_CLASS, record.state_class),)
+        resolved[code] = {
+            tag: _ObisValue(
+                "obis_" + key, record.obis, value_type.decode,
+                value_type.size, _scale(value_type.scale, key),
+                record.unit, record.icon, extra, key in HOURLY_SENSORS)
+            for tag, value_type in (values if double else singles).items()
+        }
+    return resolved
+
+
+def compile_obis(header, common, values, singles=None, strings=(),
+                 constants=None, type_length=None, mini=None):
+    """Compile a layout of OBIS coded sensors into a decoder.
+
+    header fields are decoded first, then constants are added. common is
+    the part of SENSOR_COMMON_OBIS_MAP read from the OBIS codes, with the
+    identity as strings tagged one of strings and the date and time as an
+    octet string. values maps the type tags of the sensors with two OBIS
+    codes to their ValueType, singles those of the sensors with one.
+    type_length is the length of the meter type, when not the string
+    length. mini is (list type, sensor key) of a list only decoded into
+    han_data, once the sensor is in stored.
+    """
+    index = obis_index(common, SENSOR_OBIS_MAP)
+    identities = {}
+    for key, code, double in _obis_codes(common):
+        if key == HAN_METER_TYPE:
+            decode, length = meter_type_number, type_length
+        else:
+            decode, length = text, None
+        identities[code] = _ObisIdentity(
+            "obis_" + key, OBIS_REGISTRY[code].obis, double, decode, length)
+    sensors = _obis_values(values, singles or {})
+    constants = constants or {}
+    mini_type, mini_key = mini or (None, None)
+
+    def decode(stored, pkt):
+        """Decode a frame, updating stored with the sensors."""
+        pkt = as_bytes(pkt)
+        debug = _LOGGER.isEnabledFor(logging.DEBUG)
+        han_data = {}
+        _decode_fields(header, pkt, han_data)
+        if debug:
+            _LOGGER.debug("list_type is %s", han_data[HAN_METER_LIST_TYPE])
+        found = obis_walk(pkt, index)
+        if han_data[HAN_METER_LIST_TYPE] == mini_type:
+            if mini_key in stored:
+                _decode_values(pkt, han_data, found, debug, mini_key)
+            return stored, han_data
+        han_data.update(constants)
+        for key, code, pos in found:
+            identity = identities.get(code)
+            if identity is None:
+                continue
+            tag = pkt[pos + 6]
+            if tag == TAG_OCTET_STRING and identity.double:
+                han_data[HAN_OBIS_DATETIME] = identity.obis
+                han_data[HAN_METER_DATETIME] = obis_date_time(
+                    pkt, pos + 8, pos + 16)
+            elif tag in strings:
+                start = pos + 8 + (tag == TAG_STRING_13)
+                length = pkt[start - 1]
+                han_data[identity.name] = identity.obis
+                han_data[key] = identity.decode(
+                    pkt, start, start + (identity.length or length))
+            else:
+                continue
+            if debug:
+                _LOGGER.debug("%s, OBIS:%s, Index:%s, Type:%s: %s", key,
+                              identity.obis, pos, tag, han_data.get(key))
+        stored.update(_decode_values(pkt, han_data, found, debug))
+        return stored, han_data
+
+    def _decode_values(pkt, han_data, found, debug, only=None):
+        """Decode the sensor values into han_data and sensor records."""
+        attrs = None
+        sensor_data = {}
+        for key, code, pos in found:
+            value_types = sensors.get(code)
+            if value_types is None or (only and key != only):
+                continue
+            value_type = value_types.get(pkt[pos + 6])
+            if value_type is None:
+                continue
+            (name, obis, decode_value, size, scale, unit, icon, extra,
+             dated) = value_type
+            value = decode_value(pkt, pos + 7, pos + 7 + size)
+            if scale:
+                value = value / scale
+            han_data[name] = obis
+            han_data[key] = value
+            if debug:
+                _LOGGER.debug("%s, OBIS:%s, Index:%s, Type:%s: %s", key,
+                              obis, pos, pkt[pos + 6], value)
+            if only:
+                continue
+            if attrs is None:
+                attrs = meter_identity(han_data)
+            meta = attrs
+            if dated:
+                meta = attrs + ((HAN_METER_DATETIME,
+                                 han_data[HAN_METER_DATETIME]),)
+            sensor_data[key] = sensor_record(key, value, None, unit, icon,
+                                             meta, extra)
+        return sensor_data
+
+    return decode
@@ -0,0 +1,122 @@
+"""
+Compact sensor records produced by the parsers.
+
+The static attributes of a sensor (meter identity, unit, icon, device and
+state class) are built once and shared between frames. A frame only
+creates a SensorRecord holding the key, value and timestamp. The record
+reads like the {"state": ..., "attributes": {...}} dicts in sensor_data.
+"""
+from collections.abc import Mapping
+from functools import lru_cache
+
+from custom_components.ams.const import (
+    HAN_LIST_VER_ID,
+    HAN_METER_MANUFACTURER,
+    HAN_METER_SERIAL,
+    HAN_METER_TYPE,
+    SENSOR_ATTR,
+    SENSOR_ICON,
+    SENSOR_STATE,
+    SENSOR_UOM,
+)
+
+ATTR_TIMESTAMP = "timestamp"
+
+
+@lru_cache(maxsize=256)
+def sensor_meta(unit, icon, identity=(), extra=()):
+    """Return the shared static attributes of a sensor.
+
+    identity and extra are tuples of (attribute, value) pairs, placed before
+    and after the unit and icon.
+    """
+    attrs = dict(identity)
+    attrs[SENSOR_UOM] = unit
+    attrs[SENSOR_ICON] = icon
+    attrs.update(extra)
+    return attrs
+
+
+class SensorRecord(Mapping):
+    """State of one sensor from one frame."""
+
+    __slots__ = ("key", "value", "timestamp", "meta")
+
+    def __init__(self, key, value, timestamp, meta):
+        """Initialize the record."""
+        self.key = key
+        self.value = value
+        self.timestamp = timestamp
+        self.meta = meta
+
+    @property
+    def attributes(self):
+        """Return the attributes of the sensor as a new dict."""
+        attrs = {}
+        if self.timestamp is not None:
+            attrs[ATTR_TIMESTAMP] = self.timestamp
+        attrs.update(self.meta)
+        return attrs
+
+    def __getitem__(self, name):
+        """Return the state or attributes like the sensor_data dicts."""
+        if name == SENSOR_STATE:
+            return self.value
+        if name == SENSOR_ATTR:
+            return self.attributes
+        raise KeyError(name)
+
+    def __iter__(self):
+        """Iterate over the state and attributes keys."""
+        return iter((SENSOR_STATE, SENSOR_ATTR))
+
+    def __len__(self):
+        """Return the number of keys."""
+        return 2
+
+    def __repr__(self):
+        """Return the representation of the record."""
+        return (f"SensorRecord({self.key!r}, {self.value!r}, "
+                f"{self.timestamp!r})")
+
+
+def sensor_record(key, value, timestamp, unit, icon, identity=(), extra=()):
+    """Create a record sharing the static attributes of the sensor."""
+    return SensorRecord(key, value, timestamp,
+                        sensor_meta(unit, icon, identity, extra))
+
+
+class MeterIdentity:
+    """Serial, manufacturer and type of the meter, read from han_data."""
+
+    __slots__ = ("serial", "manufacturer", "meter_type")
+
+    def __init__(self, serial=None, manufacturer=None, meter_type=None):
+        """Initialize the identity."""
+        self.serial = serial
+        self.manufacturer = manufacturer
+        self.meter_type = meter_type
+
+    @property
+    def complete(self):
+        """Return True when serial, manufacturer and type are known."""
+        return bool(self.serial and self.manufacturer and self.meter_type)
+
+    def missing(self):
+        """Return the attributes that are still unknown."""
+        return [
+            name for name, value in (
+                (HAN_METER_SERIAL, self.serial),
+                (HAN_METER_MANUFACTURER, self.manufacturer),
+                (HAN_METER_TYPE, self.meter_type),
+            ) if not value
+        ]
+
+    def update(self, han_data):
+        """Fill in the unknown fields from the han_data of a frame."""
+        if not self.serial:
+            self.serial = han_data.get(HAN_METER_SERIAL)
+        if not self.manufacturer:
+            self.manufacturer = han_data.get(HAN_LIST_VER_ID)
+        if not self.meter_type:
+            self.meter_type = han_data.get(HAN_METER_TYPE)
@@ -0,0 +1,165 @@
+"""
+Serial port playing back a capture file, for testing without a meter.
+
+pyserial finds this module through serial.protocol_handler_packages, the
+port is given as a URL:
+
+    replay:///path/to/capture[?speed=N][&loop]
+
+speed is the playback rate, 1 (the default) keeps the timing of the
+capture and "max" sends the frames as fast as they are read. With loop the
+capture starts over when it ends, otherwise reading past the end raises
+SerialException.
+
+The frames are written to a pipe by a thread, so the port has a file
+descriptor the event loop can wait on like a real serial port.
+"""
+import fcntl
+import logging
+import os
+import select
+import struct
+import termios
+import threading
+import time
+import urllib.parse
+
+from serial.serialutil import PortNotOpenError, SerialBase, SerialException
+
+from custom_components.ams.capture import read_capture
+
+_LOGGER = logging.getLogger(__name__)
+
+SPEED_MAX = "max"
+
+
+class Serial(SerialBase):
+    """Serial port reading a capture file."""
+
+    def __init__(self, *args, **kwargs):
+        """Initialize the port."""
+        self.capture_path = None
+        self.speed = 1.0
+        self.loop = False
+        self._read_fd = None
+        self._write_fd = None
+        self._player = None
+        self._stop = threading.Event()
+        super().__init__(*args, **kwargs)
+
+    def open(self):
+        """Start playing the capture."""
+        if self._port is None:
+            raise SerialException(
+                "Port must be configured before it can be used.")
+        if self.is_open:
+            raise SerialException("Port is already open.")
+        self.from_url(self.portstr)
+        if not os.path.isfile(self.capture_path):
+            raise SerialException(
+                f"Capture file not found: {self.capture_path}")
+        self._read_fd, self._write_fd = os.pipe()
+        os.set_blocking(self._read_fd, False)
+        self._stop.clear()
+        self._player = threading.Thread(
+            target=self._play, name="ams_replay", daemon=True)
+        self._player.start()
+        self.is_open = True
+
+    def from_url(self, url):
+        """Set the capture path and playback options from the URL."""
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme != "replay":
+            raise SerialException(
+                f"Expected a replay:// URL, got {url!r}")
+        options = urllib.parse.parse_qs(parts.query, keep_blank_values=True)
+        speed = options.get("speed", ["1"])[0]
+        if speed == SPEED_MAX:
+            self.speed = 0
+        else:
+            try:
+                self.speed = float(speed)
+            except ValueError as ex:
+                raise SerialException(
+                    f"Invalid replay speed {speed!r}") from ex
+            if self.speed <= 0:
+                raise SerialException(
+                    f"Invalid replay speed {speed!r}")
+        self.loop = "loop" in options
+        self.capture_path = parts.netloc + parts.path
+
+    def _play(self):
+        """Write the frames of the capture to the pipe."""
+        try:
+            while not self._stop.is_set():
+                start = time.monotonic()
+                for offset, frame in read_capture(self.capture_path):
+                    if self.speed:
+                        delay = start + offset / self.speed - time.monotonic()
+                        if delay > 0 and self._stop.wait(delay):
+                            return
+                    elif self._stop.is_set():
+                        return
+                    # Blocks while the reader is behind
+                    os.write(self._write_fd, frame)
+                if not self.loop:
+                    return
+        except (OSError, ValueError) as ex:
+            if not self._stop.is_set():
+                _LOGGER.warning("Replay of %s stopped: %s",
+                                self.capture_path, ex)
+        finally:
+            os.close(self._write_fd)
+
+    def close(self):
+        """Stop the playback."""
+        if self.is_open:
+            self._stop.set()
+            # A player blocked on the full pipe gets an error and ends
+            os.close(self._read_fd)
+            self._player.join()
+            self._player = None
+            self.is_open = False
+
+    def _reconfigure_port(self):
+        """Nothing to configure on a capture."""
+
+    @property
+    def in_waiting(self):
+        """Return the number of bytes ready to be read."""
+        if not self.is_open:
+            raise PortNotOpenError()
+        buf = fcntl.ioctl(self._read_fd, termios.FIONREAD, b"\0\0\0\0")
+        return struct.unpack("I", buf)[0]
+
+    def read(self, size=1):
+        """Read up to size bytes, waiting at most timeout seconds."""
+        if not self.is_open:
+            raise PortNotOpenError()
+        if self._timeout != 0:
+            select.select([self._read_fd], [], [], self._timeout)
+        try:
+            data = os.read(self._read_fd, size)
+        except BlockingIOError:
+            return b""
+        if not data:
+            raise SerialException("End of replay")
+        return data
+
+    def write(self, data):
+        """The HAN port is receive only, data is discarded."""
+        if not self.is_open:
+            raise PortNotOpenError()
+        return len(data)
+
+    def fileno(self):
+        """Return the file descriptor the frames are read from."""
+        if not self.is_open:
+            raise PortNotOpenError()
+        return self._read_fd
+
+    def reset_input_buffer(self):
+        """Nothing is buffered besides the pipe."""
+
+    def reset_output_buffer(self):
+        """Nothing is written."""
@@ -1,44 +1,83 @@
 """Support for reading data from a serial port."""
 import logging
+import time
 from datetime import timedelta
 
+from homeassistant.components.sensor import SensorEntity, SensorStateClass
 from homeassistant.const import STATE_UNKNOWN
 from homeassistant.core import callback
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.entity import EntityCategory
+from homeassistant.helpers.event import async_call_later
 from homeassistant.helpers.restore_state import RestoreEntity
 from homeassistant.util import dt as dt_utils
 
 from custom_components.ams.const import (
     ACTIVE_ENERGY_DEFAULT_ATTRS,
     ACTIVE_ENERGY_SENSORS,
-    AMS_DEVICES,
     AMS_ENERGY_METER,
-    AMS_SENSOR_CREATED_BUT_NOT_READ,
+    CURRENT_SENSORS,
     DOMAIN,
     HOURLY_SENSORS,
     SIGNAL_NEW_AMS_SENSOR,
-    SIGNAL_UPDATE_AMS
+    SIGNAL_UPDATE_AMS_SENSOR,
+    VOLTAGE_SENSORS,
 )
+from custom_components.ams.stats import STAGES
 
 _LOGGER = logging.getLogger(__name__)
 
+# key, unit, state class and PipelineStats attribute of the diagnostic
+# sensors
+DIAGNOSTIC_SENSORS = (
+    ("ams_frame_rate", "frames/s", SensorStateClass.MEASUREMENT,
+     "frame_rate"),
+    ("ams_crc_failures", None, SensorStateClass.TOTAL_INCREASING,
+     "crc_failures"),
+    ("ams_timeouts", None, SensorStateClass.TOTAL_INCREASING, "timeouts"),
+    ("ams_success_ratio", "%", SensorStateClass.MEASUREMENT,
+     "success_ratio"),
+    ("ams_discarded_bytes", "B", SensorStateClass.TOTAL_INCREASING,
+     "discarded_bytes"),
+)
+
+
+def diagnostic_sensors(hub):
+    """Create the diagnostic sensors of the frame pipeline of hub."""
+    sensors = [AmsLatencySensor(hub, stage) for stage in STAGES]
+    sensors.extend(AmsDiagnosticSensor(hub, *description)
+                   for description in DIAGNOSTIC_SENSORS)
+    sensors.append(AmsRejectedSensor(hub))
+    return sensors
+
+
+def deadband_class(name):
+    """Return the deadband class of a sensor, None if always written."""
+    if name in HOURLY_SENSORS:
+        return None
+    if name in VOLTAGE_SENSORS:
+        return "voltage"
+    if name in CURRENT_SENSORS:
+        return "current"
+    return "power"
+
 
 async def async_setup_entry(hass, config_entry, async_add_devices):
-    # pylint: disable=unused-argument
     """Setup sensor platform for the ui"""
+    hub = hass.data[DOMAIN][config_entry.entry_id]
 
     @callback
     def async_add_sensor():
         """Add AMS Sensor."""
         sensors = []
-        data = hass.data[DOMAIN].sensor_data
+        data = hub.sensor_data
 
         for sensor_name in data:
             # Check that we don't add a new sensor that already exists.
-            # We only try to update the state for sensors in AMS_DEVICES
-            if sensor_name not in AMS_DEVICES:
-                AMS_DEVICES.add(sensor_name)
-                if sensor_name in AMS_SENSOR_CREATED_BUT_NOT_READ:
+            # We only try to update the state for sensors in hub.devices
+            if sensor_name not in hub.devices:
+                hub.devices.add(sensor_name)
+                if sensor_name in hub.created_but_not_read:
                     # The hourly sensors is added manually at the start.
                     continue
 
@@ -47,13 +86,13 @@ async def async_setup_entry(hass, config_entry, async_add_devices):
                     "state": data.get(sensor_name, {}).get("state"),
                     "attributes": data.get(sensor_name, {}).get("attributes"),
                 }
-                sensors.append(AmsSensor(hass, sensor_states))
+                sensors.append(AmsSensor(hass, hub, sensor_states))
 
         # Handle the hourly sensors.
         for hourly in HOURLY_SENSORS:
             if hourly not in data and hourly not in (
-                    AMS_SENSOR_CREATED_BUT_NOT_READ):
-                AMS_SENSOR_CREATED_BUT_NOT_READ.add(hourly)
+                    hub.created_but_not_read):
+                hub.created_but_not_read.add(hourly)
                 _LOGGER.debug(
                     "Hourly sensor %s added so we can attempt to restore"
                     " state", hourly
@@ -70,14 +109,22 @@ async def async_setup_entry(hass, config_entry, async_add_devices):
                         "attributes": data.get(hourly, {}).get("attributes", (
                             ACTIVE_ENERGY_DEFAULT_ATTRS)),
                     }
-                sensors.append(AmsSensor(hass, sensor_states))
+                sensors.append(AmsSensor(hass, hub, sensor_states))
 
         if sensors:
             _LOGGER.debug("Trying to add %s sensors: %s", len(sensors),
                           sensors)
             async_add_devices(sensors)
 
-    async_dispatcher_connect(hass, SIGNAL_NEW_AMS_SENSOR, async_add_sensor)
+        # The diagnostic sensors are added with the first meter sensors,
+        # polled once before they are added.
+        if DIAGNOSTIC_SENSORS[0][0] not in hub.devices:
+            diagnostics = diagnostic_sensors(hub)
+            hub.devices.update(sensor.key for sensor in diagnostics)
+            async_add_devices(diagnostics, update_before_add=True)
+
+    config_entry.async_on_unload(async_dispatcher_connect(
+        hass, SIGNAL_NEW_AMS_SENSOR.format(hub.key), async_add_sensor))
 
     return True
 
@@ -96,14 +143,23 @@ async def async_remove_entry(hass, entry):
 class AmsSensor(RestoreEntity):
     """Representation of a AMS sensor."""
 
-    def __init__(self, hass, sensor_states):
-        """Initialize the Serial sensor."""
-        self.ams = hass.data[DOMAIN]
+    def __init__(self, hass, hub, sensor_states):
+        """Initialize the Serial sensor of the meter read by hub."""
+        self.ams = hub
         self._hass = hass
         self._name = sensor_states.get("name")
         self._meter_id = self.ams.meter_serial
         self._state = None
         self._attributes = {}
+        sensor_class = deadband_class(self._name)
+        self._deadband = None
+        if sensor_class is not None:
+            self._deadband = self.ams.deadband.get(sensor_class)
+        self._written_state = None
+        self._written_at = None
+        # Cancels the write scheduled for the end of the minimum interval
+        self._cancel_write = None
+        self.suppressed_writes = 0
         self._update_properties()
         _LOGGER.debug("Init %s DUMP sensor_states %s", self._name,
                       sensor_states)
@@ -119,6 +175,44 @@ class AmsSensor(RestoreEntity):
         except KeyError:
             pass
 
+    def _should_write(self):
+        """Return True if the state changed enough to be written."""
+        now = time.monotonic()
+        if self._deadband is not None and self._written_at is not None:
+            wait = self._written_at + self.ams.min_interval - now
+            if wait > 0:
+                self._write_later(wait)
+                return False
+            try:
+                delta = abs(float(self._state) - float(self._written_state))
+            except (TypeError, ValueError):
+                delta = None
+            if delta is not None and delta <= self._deadband:
+                return False
+        self._written_state = self._state
+        self._written_at = now
+        if self._cancel_write is not None:
+            self._cancel_write()
+            self._cancel_write = None
+        return True
+
+    def _write_later(self, delay):
+        """Write the latest state when the minimum interval is over.
+
+        Else a value suppressed by the interval stays unwritten if the
+        meter goes quiet.
+        """
+        if self._cancel_write is None:
+            self._cancel_write = async_call_later(
+                self._hass, delay, self._write_suppressed)
+
+    @callback
+    def _write_suppressed(self, _now):
+        """Write the state suppressed during the minimum interval."""
+        self._cancel_write = None
+        if self._should_write():
+            self.async_write_ha_state()
+
     @property
     def unique_id(self) -> str:
         """Return the unique id of the sensor."""
@@ -157,8 +251,10 @@ class AmsSensor(RestoreEntity):
     async def async_added_to_hass(self):
         """Register callbacks and restoring states to hourly sensors."""
         await super().async_added_to_hass()
-        async_dispatcher_connect(self._hass, SIGNAL_UPDATE_AMS,
-                                 self._update_callback)
+        self.async_on_remove(async_dispatcher_connect(
+            self._hass,
+            SIGNAL_UPDATE_AMS_SENSOR.format(self.ams.key, self._name),
+            self._update_callback))
         old_state = await self.async_get_last_state()
 
         if old_state is not None and self._name and self._name in (
@@ -196,9 +292,86 @@ class AmsSensor(RestoreEntity):
         else:
             _LOGGER.debug("Skipping restore state for %s", self._name)
 
+    async def async_will_remove_from_hass(self):
+        """Cancel a scheduled write."""
+        if self._cancel_write is not None:
+            self._cancel_write()
+            self._cancel_write = None
+
     @callback
     def _update_callback(self):
         """Update the state."""
-        if self._name in AMS_DEVICES:
+        if self._name in self.ams.devices:
             self._update_properties()
-            self.async_write_ha_state()
+            if self._should_write():
+                self.async_write_ha_state()
+            else:
+                self.suppressed_writes += 1
+                self.ams.suppressed_writes += 1
+                _LOGGER.debug("Suppressed write of %s, %s writes suppressed",
+                              self._name, self.ams.suppressed_writes)
+
+
+class AmsDiagnosticSensor(SensorEntity):
+    """Diagnostic sensor polling the pipeline statistics of the hub."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(self, hub, key, unit, state_class, stat):
+        """Initialize the diagnostic sensor."""
+        self.ams = hub
+        self.key = key
+        self._stat = stat
+        self._meter_id = self.ams.meter_serial
+        self._attr_native_unit_of_measurement = unit
+        self._attr_state_class = state_class
+        self._attr_unique_id = f"{key}_{self._meter_id}"
+        self._attr_name = self._attr_unique_id
+
+    @property
+    def device_info(self) -> dict:
+        """Return the device info."""
+        return {
+            "name": AMS_ENERGY_METER,
+            "identifiers": {(DOMAIN, self._meter_id)},
+            "manufacturer": self.ams.meter_manufacturer,
+            "model": self.ams.meter_type,
+        }
+
+    async def async_update(self):
+        """Read the statistic from the hub."""
+        self._attr_native_value = getattr(self.ams.stats, self._stat)
+
+
+class AmsLatencySensor(AmsDiagnosticSensor):
+    """Diagnostic sensor of the latency of one pipeline stage.
+
+    The state is the 95th percentile, p50, p95, p99 and the number of
+    frames are attributes.
+    """
+
+    def __init__(self, hub, stage):
+        """Initialize the latency sensor of stage."""
+        super().__init__(hub, f"ams_{stage}_latency", "ms",
+                         SensorStateClass.MEASUREMENT, stage)
+
+    async def async_update(self):
+        """Read the latency histogram of the stage from the hub."""
+        summary = self.ams.stats.latency[self._stat].summary()
+        self._attr_native_value = summary["p95"]
+        self._attr_extra_state_attributes = summary
+
+
+class AmsRejectedSensor(AmsDiagnosticSensor):
+    """Diagnostic sensor of the rejected frames, counted per reason."""
+
+    def __init__(self, hub):
+        """Initialize the rejected frames sensor."""
+        super().__init__(hub, "ams_rejected_frames", None,
+                         SensorStateClass.TOTAL_INCREASING, "rejected")
+
+    async def async_update(self):
+        """Read the rejected frame counters from the hub."""
+        rejected = self.ams.stats.rejected
+        self._attr_native_value = sum(rejected.values())
+        self._attr_extra_state_attributes = dict(rejected)
@@ -0,0 +1,168 @@
+"""
+Timing and counters of the frame pipeline.
+
+Each stage of a frame, read (framing and CRC), validate, parse and
+dispatch, is timed with time.perf_counter_ns into a histogram with fixed
+buckets. Recording is a bisect and an increment, so it is cheap enough to
+be always on. Rejected frames are counted per FRAME_ERROR reason.
+"""
+import time
+from bisect import bisect_left
+from collections import Counter, deque
+
+from custom_components.ams.const import (
+    FRAME_ERROR_FRAME_CRC,
+    FRAME_ERROR_TIMEOUT,
+)
+
+STAGE_READ = "read"
+STAGE_VALIDATE = "validate"
+STAGE_PARSE = "parse"
+STAGE_DISPATCH = "dispatch"
+STAGES = (STAGE_READ, STAGE_VALIDATE, STAGE_PARSE, STAGE_DISPATCH)
+
+# Upper bounds of the histogram buckets in nanoseconds, from 10 us to 1 s
+LATENCY_BUCKETS = tuple(
+    int(scale * 10 ** exponent)
+    for exponent in range(4, 9)
+    for scale in (1, 2, 5)
+) + (10 ** 9,)
+PERCENTILES = (50, 95, 99)
+# Seconds of frames the frame rate is computed over
+RATE_WINDOW = 60
+# Number of last frames the success ratio is computed over
+SUCCESS_WINDOW = 100
+
+
+class LatencyHistogram:
+    """Count of durations per fixed bucket."""
+
+    __slots__ = ("counts", "total")
+
+    def __init__(self):
+        """Initialize an empty histogram."""
+        # The last bucket holds the durations above the last bound
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0
+
+    def record(self, elapsed_ns):
+        """Add a duration in nanoseconds."""
+        self.counts[bisect_left(LATENCY_BUCKETS, elapsed_ns)] += 1
+        self.total += 1
+
+    def percentile(self, percent):
+        """Return the bucket bound of the percentile in ms, or None.
+
+        Durations above the last bucket are reported as its bound.
+        """
+        if not self.total:
+            return None
+        rank = self.total * percent / 100
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                break
+        bucket = min(bucket, len(LATENCY_BUCKETS) - 1)
+        return LATENCY_BUCKETS[bucket] / 1e6
+
+    def summary(self):
+        """Return the percentiles in ms and the number of durations."""
+        summary = {f"p{percent}": self.percentile(percent)
+                   for percent in PERCENTILES}
+        summary["count"] = self.total
+        return summary
+
+
+class PipelineStats:
+    """Latency histograms and counters of the frames from the meter."""
+
+    def __init__(self):
+        """Initialize the statistics."""
+        self.latency = {stage: LatencyHistogram() for stage in STAGES}
+        self.frames = 0
+        self.rejected = Counter()
+        # Bytes dropped while looking for the start of a frame
+        self.discarded_bytes = 0
+        self._frame_rate = None
+        self._window_start = time.monotonic()
+        self._window_frames = 0
+        self._outcomes = deque(maxlen=SUCCESS_WINDOW)
+        self._successes = 0
+
+    @property
+    def crc_failures(self):
+        """Return the number of frames with an invalid frame CRC."""
+        return self.rejected[FRAME_ERROR_FRAME_CRC]
+
+    @property
+    def timeouts(self):
+        """Return the number of frames cut off by a read timeout."""
+        return self.rejected[FRAME_ERROR_TIMEOUT]
+
+    @property
+    def success_ratio(self):
+        """Return the percentage of the last frames decoded, or None."""
+        if not self._outcomes:
+            return None
+        return round(100 * self._successes / len(self._outcomes), 1)
+
+    @property
+    def frame_rate(self):
+        """Return the frames/s of the last window.
+
+        Computed when read, so it drops to 0 when no frames arrive. Until
+        the first window is over, the rate of the frames so far.
+        """
+        now = time.monotonic()
+        self._roll_window(now)
+        if self._frame_rate is None:
+            elapsed = now - self._window_start
+            if not elapsed:
+                return None
+            return round(self._window_frames / elapsed, 3)
+        return self._frame_rate
+
+    def record(self, stage, start_ns):
+        """Record a stage started at perf_counter_ns start_ns."""
+        self.latency[stage].record(time.perf_counter_ns() - start_ns)
+
+    def count_frame(self):
+        """Count a decoded frame, updating the frame rate."""
+        self.frames += 1
+        self._outcome(True)
+        self._window_frames += 1
+        self._roll_window(time.monotonic())
+
+    def _roll_window(self, now):
+        """Compute the frame rate and start a new window once it is over."""
+        elapsed = now - self._window_start
+        if elapsed >= RATE_WINDOW:
+            self._frame_rate = round(self._window_frames / elapsed, 3)
+            self._window_start = now
+            self._window_frames = 0
+
+    def reject(self, reason):
+        """Count a rejected frame."""
+        self.rejected[reason] += 1
+        self._outcome(False)
+
+    def _outcome(self, success):
+        """Add a frame to the success ratio window."""
+        outcomes = self._outcomes
+        if len(outcomes) == SUCCESS_WINDOW:
+            self._successes -= outcomes[0]
+        outcomes.append(success)
+        self._successes += success
+
+    def as_dict(self):
+        """Return the statistics for the diagnostics."""
+        return {
+            "frames": self.frames,
+            "frame_rate": self.frame_rate,
+            "success_ratio": self.success_ratio,
+            "rejected": dict(self.rejected),
+            "discarded_bytes": self.discarded_bytes,
+            "latency_ms": {stage: histogram.summary()
+                           for stage, histogram in self.latency.items()},
+        }
@@ -0,0 +1,42 @@
+"""
+Debug logging of the frames from the meter.
+
+Packets are logged wrapped in HexDump, which renders them only when a log
+record is actually emitted. FrameTracer logs one of every N received
+frames, so debug logging can be left on without dumping every frame.
+"""
+import logging
+
+
+class HexDump:
+    """Bytes rendered as hex when the log message is formatted."""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        """Wrap the bytes or list of ints to dump."""
+        self.data = data
+
+    def __str__(self):
+        """Return the data as space separated hex bytes."""
+        return bytes(self.data).hex(" ")
+
+
+class FrameTracer:
+    """Log a sample of the received frames at debug level."""
+
+    def __init__(self, logger, sample=1):
+        """Initialize the tracer, one of every sample frames is logged."""
+        self._logger = logger
+        self.sample = max(int(sample), 1)
+        self._count = 0
+
+    def trace(self, message, frame):
+        """Log message with a hex dump of frame, if it is sampled."""
+        if not self._logger.isEnabledFor(logging.DEBUG):
+            return
+        self._count += 1
+        if self._count % self.sample:
+            return
+        self._logger.debug("%s (frame %s, %s bytes): %s", message,
+                           self._count, len(frame), HexDump(frame))
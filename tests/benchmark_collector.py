@@ -0,0 +1,82 @@
+"""Measure the frames/s of the collector reading many TCP bridges.
+
+Run from the repository root with: python -m tests.benchmark_collector [n]
+n local bridges (default 20) send the Aidon and Kaifa test packets as fast
+as they are read. The collector runs on one thread, the frames/s it
+reaches is the throughput of one core, with JSON encoding included.
+"""
+import asyncio
+import sys
+import time
+
+from custom_components.ams.collector import MeterStream
+from tests.common_test_data import TestData
+
+FRAMES = 40000
+
+
+class CountingSink:
+    """Sink counting the lines and dropping them."""
+
+    def __init__(self):
+        """Initialize the count."""
+        self.lines = 0
+
+    def write(self, line):  # pylint: disable=unused-argument
+        """Count one line."""
+        self.lines += 1
+
+
+async def bridge(packages, frames, writers):
+    """Start a TCP server sending frames packets, returns its port."""
+    data = b"".join(bytes(packages[i % len(packages)])
+                    for i in range(frames))
+
+    async def serve(reader, writer):  # pylint: disable=unused-argument
+        # Kept open until the end, the collector would connect again
+        writers.append(writer)
+        writer.write(data)
+        await writer.drain()
+
+    server = await asyncio.start_server(serve, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+async def collect(meters):
+    """Read FRAMES frames from the bridges, returns (frames, seconds)."""
+    packages = ([TestData.AIDON_SHORT, TestData.AIDON_MINI,
+                 TestData.AIDON_HOURLY], [TestData.KAIFA_HOURLY])
+    per_meter = FRAMES // meters
+    sink = CountingSink()
+    servers = []
+    writers = []
+    streams = []
+    for i in range(meters):
+        server, port = await bridge(packages[i % 2], per_meter, writers)
+        servers.append(server)
+        streams.append(MeterStream(f"socket://127.0.0.1:{port}", sink))
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(stream.run()) for stream in streams]
+    while sink.lines < per_meter * meters:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    for task in tasks:
+        task.cancel()
+    for writer in writers:
+        writer.close()
+    for server in servers:
+        server.close()
+        await server.wait_closed()
+    return sink.lines, elapsed
+
+
+def main():
+    """Print the throughput of the collector."""
+    meters = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    frames, elapsed = asyncio.run(collect(meters))
+    print(f"{meters} meters, {frames} frames in {elapsed:.2f} s, "
+          f"{frames / elapsed:.0f} frames/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""Compare the table driven CRC-16/X25 with crccheck.
+
+Run from the repository root with: python -m tests.benchmark_crc
+"""
+import timeit
+
+from crccheck.crc import CrcX25
+from custom_components.ams.parsers.crc import crc16_x25
+from tests.common_test_data import TestData
+
+ROUNDS = 2000
+
+
+def main():
+    """Print the time per frame check for the test packets."""
+    for name in ("AIDON_MINI", "AIDON_HOURLY", "KAMSTRUP_HOURLY"):
+        pkg = getattr(TestData, name)
+        frame = bytes(pkg)
+        stop = len(pkg) - 3
+        results = (
+            ("CrcX25.calc", lambda: CrcX25.calc(bytes(pkg[1:-3]))),
+            ("crc16_x25 list", lambda: crc16_x25(pkg, 1, stop)),
+            ("crc16_x25 bytes", lambda: crc16_x25(frame, 1, stop)),
+        )
+        base = None
+        for label, func in results:
+            elapsed = timeit.timeit(func, number=ROUNDS) / ROUNDS * 1e6
+            base = base or elapsed
+            print(f"{name:16} {len(pkg):4} bytes  {label:16} "
+                  f"{elapsed:8.1f} us  x{base / elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    main()
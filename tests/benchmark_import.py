@@ -0,0 +1,54 @@
+"""Measure the import time of the parser core and of the integration.
+
+Run from the repository root with: python -m tests.benchmark_import
+
+Every module is imported in a new interpreter, the median of the runs and
+the number of Home Assistant modules it pulled in are printed. The core and
+the collector are imported as if Home Assistant was not installed, the
+package imports the integration when it is.
+"""
+import statistics
+import subprocess
+import sys
+
+RUNS = 5
+
+# name, module, True to hide Home Assistant
+MODULES = (
+    ("core", "custom_components.ams.parsers.decoder", True),
+    ("collector", "custom_components.ams.collector", True),
+    ("integration", "custom_components.ams.hub", False),
+    ("sensor platform", "custom_components.ams.sensor", False),
+)
+
+SCRIPT = """
+import sys, time
+if {hide}:
+    sys.modules["homeassistant"] = None
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, sum(name.startswith("homeassistant") and module is not None
+                  for name, module in sys.modules.items()))
+"""
+
+
+def import_time(module, hide):
+    """Import module in a new interpreter, returns (seconds, HA modules)."""
+    output = subprocess.run(
+        [sys.executable, "-c", SCRIPT.format(module=module, hide=hide)],
+        check=True, capture_output=True, text=True).stdout.split()
+    return float(output[0]), int(output[1])
+
+
+def main():
+    """Print the import time of every module."""
+    for name, module, hide in MODULES:
+        runs = [import_time(module, hide) for _ in range(RUNS)]
+        median = statistics.median(elapsed for elapsed, _ in runs)
+        print(f"{name:16} {median * 1000:7.1f} ms, "
+              f"{runs[0][1]} Home Assistant modules")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Benchmark the frame validation, parsing and framing of every meter list.
+
+Run from the repository root with: python -m tests.benchmark_parsers
+
+Prints frames/s and the peak memory allocated per frame. Save a baseline
+with --save baseline.json, later runs given --compare baseline.json exit
+with status 1 when a case is slower than the baseline by more than
+--threshold (default 0.2, 20 %).
+"""
+import argparse
+import json
+import sys
+import timeit
+import tracemalloc
+
+from custom_components.ams.parsers import aidon
+from custom_components.ams.parsers import aidon_se
+from custom_components.ams.parsers import kaifa
+from custom_components.ams.parsers import kaifa_se
+from custom_components.ams.parsers import kamstrup
+from custom_components.ams.parsers.decoder import MeterDecoder
+from custom_components.ams.parsers.hdlc import HdlcFrameBuffer
+from tests.common_test_data import TestData
+
+# name, parser, packet, swedish
+LISTS = (
+    ("aidon mini", aidon, TestData.AIDON_MINI, None),
+    ("aidon short", aidon, TestData.AIDON_SHORT, None),
+    ("aidon hourly", aidon, TestData.AIDON_HOURLY, None),
+    ("aidon_se 3ph", aidon_se, TestData.AIDON_SE_3PH, None),
+    ("kaifa 1ph short", kaifa, TestData.KAIFA_1PH_SHORT, None),
+    ("kaifa short", kaifa, TestData.KAIFA_MA304H4_SHORT, None),
+    ("kaifa long", kaifa, TestData.KAIFA_MA304H4_LONG, None),
+    ("kaifa hourly", kaifa, TestData.KAIFA_HOURLY, None),
+    ("kaifa MA304H4D", kaifa, TestData.KAIFA_MA304H4D_LONG, True),
+    ("kaifa_se", kaifa_se, TestData.KAIFA_MA304H4_SE, None),
+    ("kamstrup short", kamstrup, TestData.KAMSTRUP, None),
+    ("kamstrup hourly", kamstrup, TestData.KAMSTRUP_HOURLY, None),
+)
+# Bytes per read from the port when framing a stream
+CHUNK_SIZE = 64
+# Timing runs, the fastest one is used
+REPEAT = 5
+
+
+def _parse(parser, pkg, swedish):
+    """Return a function parsing pkg."""
+    if swedish:
+        return lambda: parser.parse_data({}, pkg, swedish)
+    return lambda: parser.parse_data({}, pkg)
+
+
+def _framing(packages):
+    """Return a function splitting the packages from port sized chunks."""
+    stream = bytes(sum(packages, []))
+    chunks = [stream[i:i + CHUNK_SIZE]
+              for i in range(0, len(stream), CHUNK_SIZE)]
+
+    def run():
+        frames = HdlcFrameBuffer()
+        for chunk in chunks:
+            frames.feed(chunk)
+            for _ in frames.frames():
+                pass
+    return run
+
+
+def _decoding(parser, packages):
+    """Return a function framing and decoding the packages."""
+    stream = bytes(sum(packages, []))
+    chunks = [stream[i:i + CHUNK_SIZE]
+              for i in range(0, len(stream), CHUNK_SIZE)]
+
+    def run():
+        decoder = MeterDecoder(parser)
+        for chunk in chunks:
+            for _ in decoder.feed(chunk):
+                pass
+    return run
+
+
+def cases():
+    """Yield (name, function, frames per call) for every benchmark."""
+    for name, parser, pkg, swedish in LISTS:
+        yield (f"{name} test_valid_data",
+               lambda p=parser, d=pkg: p.test_valid_data(d, False), 1)
+        yield f"{name} parse_data", _parse(parser, pkg, swedish), 1
+    aidon_stream = [TestData.AIDON_HOURLY] + [TestData.AIDON_SHORT] * 4
+    yield "framing aidon", _framing(aidon_stream), len(aidon_stream)
+    yield ("decoder aidon", _decoding(aidon, aidon_stream),
+           len(aidon_stream))
+
+
+def measure(func, frames):
+    """Return frames/s and peak bytes allocated per frame."""
+    timer = timeit.Timer(func)
+    rounds, _ = timer.autorange()
+    elapsed = min(timer.repeat(number=rounds, repeat=REPEAT))
+    tracemalloc.start()
+    func()
+    tracemalloc.reset_peak()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return rounds * frames / elapsed, peak // frames
+
+
+def main():
+    """Run the benchmarks, save or compare a baseline."""
+    args = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    args.add_argument("--save", help="write the results to this file")
+    args.add_argument("--compare", help="compare with this baseline")
+    args.add_argument("--threshold", type=float, default=0.2,
+                      help="allowed slowdown, 0.2 is 20 %%")
+    options = args.parse_args()
+    baseline = {}
+    if options.compare:
+        with open(options.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+    results = {}
+    regressions = []
+    for name, func, frames in cases():
+        rate, peak = measure(func, frames)
+        results[name] = {"frames_per_s": rate, "peak_bytes": peak}
+        line = f"{name:32} {rate:10.0f} frames/s {peak:8d} B/frame"
+        base = baseline.get(name)
+        if base:
+            change = rate / base["frames_per_s"] - 1
+            line += f"  {change:+7.1%}"
+            if change < -options.threshold:
+                regressions.append(name)
+                line += "  REGRESSION"
+        print(line)
+    if options.save:
+        with open(options.save, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    if regressions:
+        print(f"{len(regressions)} regressions beyond "
+              f"{options.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Measure the frames/s of the hub by replaying a capture at max speed.
+
+Run from the repository root with: python -m tests.benchmark_replay [file]
+Without a capture file, one is written from the Aidon test packets.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import custom_components.ams.hub as ams
+from custom_components.ams.capture import CaptureWriter
+from tests.common_test_data import TestData
+
+FRAMES = 20000
+
+
+def write_capture(path):
+    """Write FRAMES Aidon test packets to a capture file."""
+    packages = [TestData.AIDON_SHORT, TestData.AIDON_MINI,
+                TestData.AIDON_HOURLY]
+    capture = CaptureWriter(path)
+    for i in range(FRAMES):
+        capture.write(bytes(packages[i % len(packages)]), now=i)
+    capture.close()
+
+
+async def replay(path):
+    """Replay the capture through the hub, returns (frames, seconds)."""
+    loop = asyncio.get_running_loop()
+
+    async def add_executor_job(target, *args):
+        return await loop.run_in_executor(None, target, *args)
+
+    hass = SimpleNamespace(loop=loop, data={},
+                           async_add_executor_job=add_executor_job,
+                           async_create_task=loop.create_task)
+    hub = ams.AmsHub(hass, {
+        "protocol": "serial",
+        "serial_port": f"replay://{path}?speed=max",
+        "baudrate": 2400,
+        "parity": "N",
+        "meter_manufacturer": "auto",
+    })
+    handled = 0
+    handle_frame = hub._handle_frame  # pylint: disable=protected-access
+
+    def count_frame(frame):
+        nonlocal handled
+        handled += 1
+        handle_frame(frame)
+
+    hub._handle_frame = count_frame  # pylint: disable=protected-access
+    start = time.perf_counter()
+    await hub.async_connect()
+    # pylint: disable=protected-access
+    while not hub._transport.is_closing():
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    hub.stop_serial_read()
+    return handled, elapsed
+
+
+def main():
+    """Print the throughput of the reader, parser and dispatcher."""
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        path = os.path.join(tempfile.mkdtemp(), "aidon.cap")
+        write_capture(path)
+    with patch.object(ams, "async_dispatcher_send", lambda hass, signal: 0):
+        frames, elapsed = asyncio.run(replay(path))
+    print(f"{frames} frames in {elapsed:.2f} s, {frames / elapsed:.0f} "
+          f"frames/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,7 +13,7 @@ from custom_components.ams.parsers import aidon_se
 from custom_components.ams.parsers import kaifa
 from custom_components.ams.parsers import kaifa_se
 from custom_components.ams.parsers import kamstrup
-from custom_components.ams import AmsHub
+from custom_components.ams.hub import AmsHub
 from custom_components.ams.const import DOMAIN
 
 METERTYPE = aidon
@@ -112,7 +112,7 @@ config = {
 hub = AmsHub(HomeAssistant, config)
 hass = HomeAssistant
 hass.data = {}
-hass.data[DOMAIN] = hub
+hass.data[DOMAIN] = {hub.key: hub}
 AmsHub._check_for_new_sensors_and_update(hub, meter_data)
 pprint.pprint(meter_data)
 
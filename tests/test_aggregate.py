@@ -0,0 +1,35 @@
+import sys
+from custom_components.ams.aggregate import PowerAggregator
+from custom_components.ams.parsers import aidon
+from .common_test_data import TestData
+
+sys.path.append('../')
+
+
+def _power(state, unit="W"):
+    return {"state": state, "attributes": {"unit_of_measurement": unit}}
+
+
+def test_aggregate_window():
+    aggregator = PowerAggregator(10)
+    assert aggregator.add("p", _power(1000), 0) is None
+    assert aggregator.add("p", _power(3000), 4) is None
+    assert aggregator.add("p", _power(500), 8) is None
+    value = aggregator.add("p", _power(1500), 10)
+    assert value == {
+        "state": 1500,
+        "attributes": {"unit_of_measurement": "W", "min": 500, "max": 3000},
+    }
+    # A new window starts with the next value
+    assert aggregator.add("p", _power(1000), 12) is None
+
+
+def test_aggregate_handles_power_only():
+    aggregator = PowerAggregator(10)
+    meter_data, _ = aidon.parse_data({}, TestData.AIDON_HOURLY)
+    handled = {key for key, value in meter_data.items()
+               if aggregator.handles(key, value)}
+    assert "ams_active_power_import" in handled
+    assert "ams_reactive_power_export" in handled
+    assert "ams_voltage_l1" not in handled
+    assert "ams_active_energy_import" not in handled
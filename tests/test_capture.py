@@ -0,0 +1,109 @@
+import asyncio
+import sys
+from types import SimpleNamespace
+import pytest
+import serial
+import custom_components.ams.hub as ams
+from custom_components.ams.hub import AmsHub
+from custom_components.ams.capture import (
+    CaptureThread,
+    CaptureWriter,
+    read_capture,
+)
+from .common_test_data import TestData
+
+sys.path.append('../')
+
+PACKAGES = [TestData.AIDON_HOURLY, TestData.AIDON_SHORT, TestData.AIDON_MINI]
+
+
+def _write_capture(path, packages, step=0.0):
+    capture = CaptureWriter(path)
+    for i, pkg in enumerate(packages):
+        capture.write(bytes(pkg), now=100 + i * step)
+    capture.close()
+
+
+def test_capture_round_trip(tmp_path):
+    path = tmp_path / "aidon.cap"
+    _write_capture(path, PACKAGES, step=2.5)
+    assert list(read_capture(path)) == [
+        (i * 2.5, bytes(pkg)) for i, pkg in enumerate(PACKAGES)]
+
+
+def test_capture_thread(tmp_path):
+    path = tmp_path / "aidon.cap"
+    capture = CaptureThread(CaptureWriter(path))
+    capture.start()
+    for pkg in PACKAGES:
+        capture.write(bytes(pkg))
+    capture.close()
+    capture.join(5)
+    assert capture.frames == len(PACKAGES)
+    assert [frame for _, frame in read_capture(path)] == [
+        bytes(pkg) for pkg in PACKAGES]
+
+
+def test_capture_truncated(tmp_path):
+    path = tmp_path / "aidon.cap"
+    _write_capture(path, PACKAGES)
+    path.write_bytes(path.read_bytes()[:-5])
+    assert len(list(read_capture(path))) == 2
+
+
+def test_capture_not_a_capture(tmp_path):
+    path = tmp_path / "aidon.cap"
+    path.write_bytes(bytes(TestData.AIDON_MINI))
+    with pytest.raises(ValueError):
+        list(read_capture(path))
+
+
+def test_replay_url(tmp_path):
+    path = tmp_path / "aidon.cap"
+    _write_capture(path, PACKAGES, step=0.01)
+    port = serial.serial_for_url(f"replay://{path}?speed=max", timeout=1)
+    received = b""
+    try:
+        while len(received) < len(bytes(sum(PACKAGES, []))):
+            received += port.read(4096)
+        with pytest.raises(serial.SerialException):
+            port.read(4096)
+    finally:
+        port.close()
+    assert received == bytes(sum(PACKAGES, []))
+
+
+def test_replay_invalid_speed(tmp_path):
+    path = tmp_path / "aidon.cap"
+    _write_capture(path, PACKAGES)
+    with pytest.raises(serial.SerialException):
+        serial.serial_for_url(f"replay://{path}?speed=fast")
+
+
+def test_hub_reads_replay(tmp_path, monkeypatch):
+    path = tmp_path / "aidon.cap"
+    _write_capture(path, PACKAGES * 3)
+    monkeypatch.setattr(ams, "async_dispatcher_send", lambda hass, signal: 0)
+    loop = asyncio.new_event_loop()
+
+    async def add_executor_job(target, *args):
+        return await loop.run_in_executor(None, target, *args)
+
+    hass = SimpleNamespace(loop=loop, data={},
+                           async_add_executor_job=add_executor_job,
+                           async_create_task=loop.create_task)
+    hub = AmsHub(hass, {"protocol": "serial",
+                        "serial_port": f"replay://{path}?speed=max",
+                        "baudrate": 2400, "parity": "N",
+                        "meter_manufacturer": "auto"})
+
+    async def run():
+        await hub.async_connect()
+        while not hub._transport.is_closing():
+            await asyncio.sleep(0.01)
+        hub.stop_serial_read()
+
+    loop.run_until_complete(asyncio.wait_for(run(), 10))
+    loop.close()
+    assert hub.meter_manufacturer == "aidon"
+    assert hub.meter_serial == "7359992895913195"
@@ -0,0 +1,63 @@
+import json
+import sys
+import pytest
+from custom_components.ams.collector import MeterStream, parse_url
+from custom_components.ams.parsers.hdlc import HdlcFrameBuffer
+from .common_test_data import TestData
+
+sys.path.append('../')
+
+
+class ListSink:
+    def __init__(self):
+        self.lines = []
+
+    def write(self, line):
+        self.lines.append(json.loads(line))
+
+
+def _feed(meter, pkg):
+    frames = HdlcFrameBuffer()
+    frames.feed(bytes(pkg))
+    meter.handle_frame(frames.pop())
+
+
+def test_parse_url():
+    assert parse_url("socket://10.0.0.2:3001") == (
+        "10.0.0.2:3001", "10.0.0.2", 3001, "auto")
+    assert parse_url("socket://bridge:3001?manufacturer=kaifa&name=garage") \
+        == ("garage", "bridge", 3001, "kaifa")
+    with pytest.raises(ValueError):
+        parse_url("tcp://10.0.0.2:3001")
+    with pytest.raises(ValueError):
+        parse_url("socket://10.0.0.2:3001?manufacturer=landis")
+
+
+def test_collector_detects_and_decodes():
+    sink = ListSink()
+    meter = MeterStream("socket://bridge:3001?name=house", sink)
+    _feed(meter, TestData.AIDON_HOURLY)
+    _feed(meter, TestData.AIDON_SHORT)
+    assert meter.manufacturer == "aidon"
+    assert meter.frames == 2
+    hourly, short = sink.lines
+    assert hourly["meter"] == "house"
+    assert hourly["serial"] == "7359992895913195"
+    assert hourly["values"]["ams_active_energy_import"] == 94064.59
+    # Only the values of the sensors in the frame
+    assert "ams_active_energy_import" not in short["values"]
+    assert short["serial"] == "7359992895913195"
+
+
+def test_collector_skips_unknown_frames():
+    sink = ListSink()
+    meter = MeterStream("socket://bridge:3001", sink)
+    corrupt = list(TestData.KAIFA_HOURLY)
+    corrupt[40] ^= 0xFF
+    _feed(meter, corrupt)
+    assert meter.frames == 0
+    assert meter.manufacturer == "auto"
+    assert sink.lines == []
+    _feed(meter, TestData.KAIFA_HOURLY)
+    assert meter.manufacturer == "kaifa"
+    assert sink.lines[0]["serial"] == "6970631405808469"
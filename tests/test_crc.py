@@ -0,0 +1,51 @@
+import sys
+from crccheck.crc import CrcX25
+from custom_components.ams.parsers.crc import (CRC_INIT,
+                                               CRC_XOROUT,
+                                               check_sequence,
+                                               crc16_x25,
+                                               crc16_x25_update,
+                                               frame_check)
+from custom_components.ams.parsers.hdlc import HdlcFrameBuffer
+from .common_test_data import TestData
+
+sys.path.append('../')
+
+
+def test_crc_matches_crccheck():
+    for pkg in (TestData.AIDON_HOURLY, TestData.KAMSTRUP,
+                TestData.KAIFA_MA304H4D_LONG):
+        expected = CrcX25.calc(bytes(pkg[1:-3]))
+        assert crc16_x25(pkg, 1, len(pkg) - 3) == expected
+        assert crc16_x25(bytes(pkg), 1, len(pkg) - 3) == expected
+        assert crc16_x25(memoryview(bytes(pkg)), 1, len(pkg) - 3) == expected
+
+
+def test_crc_incremental():
+    pkg = bytes(TestData.AIDON_HOURLY)
+    crc = CRC_INIT
+    for start in range(1, len(pkg) - 3, 10):
+        crc = crc16_x25_update(crc, pkg, start, min(start + 10, len(pkg) - 3))
+    assert crc ^ CRC_XOROUT == crc16_x25(pkg, 1, len(pkg) - 3)
+
+
+def test_check_sequence():
+    pkg = list(TestData.AIDON_HOURLY)
+    assert check_sequence(pkg, 1, 7)
+    assert frame_check(pkg)
+    pkg[20] ^= 0xFF
+    assert check_sequence(pkg, 1, 7)
+    assert not frame_check(pkg)
+
+
+def test_frame_buffer_fcs():
+    stream = bytes(TestData.AIDON_HOURLY)
+    corrupt = bytearray(stream)
+    corrupt[20] ^= 0xFF
+    frames = HdlcFrameBuffer()
+    for i in range(0, len(stream), 7):
+        frames.feed(stream[i:i + 7])
+    frames.feed(bytes(corrupt))
+    good, bad = list(frames.frames())
+    assert good.fcs_valid and frame_check(good)
+    assert not bad.fcs_valid and not frame_check(bad)
@@ -0,0 +1,76 @@
+import subprocess
+import sys
+import pytest
+from custom_components.ams.parsers import kaifa
+from custom_components.ams.parsers.decoder import (
+    PARSERS,
+    MeterDecoder,
+    load_parser,
+)
+from .common_test_data import TestData
+
+sys.path.append('../')
+
+
+@pytest.mark.parametrize("manufacturer, swedish, packages", [
+    ("aidon", None, [TestData.AIDON_HOURLY, TestData.AIDON_SHORT,
+                     TestData.AIDON_MINI]),
+    ("aidon_se", None, [TestData.AIDON_SE_3PH]),
+    ("kaifa", None, [TestData.KAIFA_HOURLY, TestData.KAIFA_1PH_SHORT,
+                     TestData.KAIFA_MA304H4_SHORT]),
+    ("kaifa", True, [TestData.KAIFA_MA304H4D_LONG,
+                     TestData.KAIFA_MA304H4D_SHORT]),
+    ("kaifa_se", None, [TestData.KAIFA_MA304H4_SE]),
+    ("kamstrup", None, [TestData.KAMSTRUP_HOURLY, TestData.KAMSTRUP]),
+])
+def test_decoder_matches_parser(manufacturer, swedish, packages):
+    decoder = MeterDecoder.for_manufacturer(manufacturer, swedish)
+    parser = decoder.parser
+    stream = bytes(sum(packages, []))
+    decoded = []
+    for i in range(0, len(stream), 13):
+        decoded.extend(decoder.feed(stream[i:i + 13]))
+    assert len(decoded) == len(packages)
+    expected = {}
+    for pkg, frame in zip(packages, decoded):
+        if swedish:
+            expected, han_data = parser.parse_data(expected, pkg, swedish)
+        else:
+            expected, han_data = parser.parse_data(expected, pkg)
+        assert frame.han_data == han_data
+    assert dict(decoder.sensor_data) == expected
+    assert decoder.rejected == 0
+
+
+def test_decoder_updated_keys():
+    decoder = MeterDecoder(kaifa)
+    first = decoder.decode(TestData.KAIFA_HOURLY)
+    second = decoder.decode(TestData.KAIFA_1PH_SHORT)
+    assert set(first.updated) == set(decoder.sensor_data)
+    short, _ = kaifa.parse_data({}, TestData.KAIFA_1PH_SHORT)
+    assert set(second.updated) == set(short)
+
+
+def test_decoder_rejects_frames():
+    decoder = MeterDecoder(kaifa)
+    assert list(decoder.feed(bytes(TestData.KAIFA_INCORRECT_PKG_CRC))) == []
+    assert decoder.decode(TestData.KAIFA_INVALID_DATA_FLAG) is None
+    assert decoder.rejected == 2
+    assert decoder.sensor_data == {}
+
+
+def test_load_parser():
+    assert load_parser("kaifa") is kaifa
+    with pytest.raises(KeyError):
+        load_parser("landis")
+
+
+def test_only_the_meter_parser_is_imported():
+    script = ("import sys; "
+              "from custom_components.ams.parsers.decoder import MeterDecoder; "
+              "MeterDecoder.for_manufacturer('kamstrup'); "
+              "print(' '.join(sorted(name for name in sys.modules "
+              "if name in " + repr(set(PARSERS.values())) + ")))")
+    output = subprocess.run([sys.executable, "-c", script], check=True,
+                            capture_output=True, text=True).stdout
+    assert output.split() == ["custom_components.ams.parsers.kamstrup"]
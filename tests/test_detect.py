@@ -0,0 +1,30 @@
+import sys
+from custom_components.ams.parsers.detect import (CONFIDENCE_HEADER,
+                                                  CONFIDENCE_ID,
+                                                  detect_meter,
+                                                  scan_signatures)
+from .common_test_data import TestData
+
+sys.path.append('../')
+
+
+def test_detect_manufacturers():
+    for pkg, expected in (
+            (TestData.AIDON_SHORT, ("aidon", CONFIDENCE_ID)),
+            (TestData.AIDON_SE_3PH, ("aidon_se", CONFIDENCE_HEADER)),
+            (TestData.KAIFA_MA304H4D_LONG, ("kaifa", CONFIDENCE_ID)),
+            (TestData.KAIFA_MA304H4_SE, ("kaifa_se", CONFIDENCE_ID)),
+            (TestData.KAMSTRUP, ("kamstrup", CONFIDENCE_ID)),
+    ):
+        assert detect_meter(pkg) == expected
+        assert detect_meter(bytes(pkg)) == expected
+
+
+def test_detect_nothing():
+    assert detect_meter(None) is None
+    assert detect_meter([1, 2, 3, 4, 5]) is None
+
+
+def test_scan_overlapping_signatures():
+    found = scan_signatures(b"xxKFM_Kamstrup_\x01\x00\x01\x07\x00\xff")
+    assert found == {b"KFM_", b"Kamstrup_", b"\x01\x00\x01\x07\x00\xff"}
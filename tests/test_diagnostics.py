@@ -0,0 +1,26 @@
+import sys
+from types import SimpleNamespace
+from custom_components.ams.hub import AmsHub
+from custom_components.ams.const import DOMAIN
+from custom_components.ams.diagnostics import (
+    async_get_config_entry_diagnostics)
+
+sys.path.append('../')
+
+
+async def test_diagnostics(hass):
+    data = {"protocol": "tcp_ip", "tcp_host": "10.0.0.2", "tcp_port": 3001,
+            "meter_manufacturer": "aidon",
+            "detected": {"meter_manufacturer": "aidon",
+                         "meter_serial": "7359992895913195"}}
+    hub = AmsHub(hass, data)
+    hub.stats.reject("frame_crc")
+    hass.data[DOMAIN] = {"1": hub}
+    diagnostics = await async_get_config_entry_diagnostics(
+        hass, SimpleNamespace(entry_id="1", data=data))
+    assert diagnostics["entry"]["tcp_host"] == "**REDACTED**"
+    assert diagnostics["entry"]["detected"]["meter_serial"] == "**REDACTED**"
+    assert diagnostics["meter"]["manufacturer"] == "aidon"
+    assert diagnostics["frames"]["rejected"] == {"frame_crc": 1}
+    assert diagnostics["frames"]["success_ratio"] == 0.0
+    assert diagnostics["handoff"]["dropped"] == 0
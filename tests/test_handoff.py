@@ -0,0 +1,37 @@
+import asyncio
+import sys
+from custom_components.ams.handoff import CoalescingHandoff
+
+sys.path.append('../')
+
+
+def test_handoff_coalesces_until_consumed():
+    loop = asyncio.new_event_loop()
+    received = []
+    handoff = CoalescingHandoff(loop, received.append)
+    for item in range(3):
+        handoff.put(item)
+    loop.run_until_complete(asyncio.sleep(0))
+    assert received == [2]
+    assert handoff.delivered == 1
+    assert handoff.coalesced == 2
+
+    handoff.put(3)
+    loop.run_until_complete(asyncio.sleep(0))
+    assert received == [2, 3]
+    assert handoff.as_dict() == {"delivered": 2, "coalesced": 2,
+                                 "dropped": 0}
+    loop.close()
+
+
+def test_handoff_drops_after_close():
+    loop = asyncio.new_event_loop()
+    received = []
+    handoff = CoalescingHandoff(loop, received.append)
+    handoff.put(1)
+    handoff.close()
+    handoff.put(2)
+    loop.run_until_complete(asyncio.sleep(0))
+    assert received == []
+    assert handoff.dropped == 2
+    loop.close()
@@ -0,0 +1,63 @@
+import sys
+from custom_components.ams.parsers.hdlc import HdlcFrameBuffer, HdlcProtocol
+from .common_test_data import TestData
+
+sys.path.append('../')
+
+
+def test_frames_split_from_chunks():
+    stream = bytes([1, 2, 3] + TestData.AIDON_MINI + TestData.KAMSTRUP)
+    frames = HdlcFrameBuffer()
+    for i in range(0, len(stream), 7):
+        frames.feed(stream[i:i + 7])
+    assert list(frames.frames()) == [bytes(TestData.AIDON_MINI),
+                                     bytes(TestData.KAMSTRUP)]
+    assert not frames.in_frame
+
+
+def test_frames_shared_flag():
+    frames = HdlcFrameBuffer()
+    frames.feed(bytes(TestData.AIDON_MINI + TestData.AIDON_MINI[1:]))
+    assert frames.pop() == bytes(TestData.AIDON_MINI)
+    assert frames.pop() is None
+
+
+def test_frames_invalid_end_flag():
+    pkg = TestData.AIDON_MINI[:-1] + [0]
+    frames = HdlcFrameBuffer()
+    frames.feed(bytes(pkg + TestData.AIDON_MINI))
+    assert list(frames.frames()) == [bytes(TestData.AIDON_MINI)]
+
+
+def test_frames_oss_missing_end_flag():
+    pkg = TestData.AIDON_MINI[:-1] + [0]
+    frames = HdlcFrameBuffer(oss=TestData.OSS_TRUE)
+    frames.feed(bytes(pkg))
+    assert frames.pop() == bytes(pkg)
+
+
+def test_frames_flush_partial():
+    frames = HdlcFrameBuffer()
+    frames.feed(bytes(TestData.AIDON_MINI[:20]))
+    assert frames.in_frame
+    assert frames.flush() == bytes(TestData.AIDON_MINI[:20])
+    assert not frames.in_frame
+    frames.feed(bytes(TestData.AIDON_MINI))
+    assert frames.pop() == bytes(TestData.AIDON_MINI)
+
+
+def test_protocol_frame_callback():
+    received = []
+    protocol = HdlcProtocol(received.append)
+    stream = bytes(TestData.AIDON_MINI + TestData.KAMSTRUP)
+    protocol.data_received(stream[:30])
+    protocol.data_received(stream[30:])
+    assert received == [bytes(TestData.AIDON_MINI), bytes(TestData.KAMSTRUP)]
+
+
+def test_protocol_timeout_flush():
+    received = []
+    protocol = HdlcProtocol(received.append, timeout=-1)
+    protocol.data_received(bytes(TestData.AIDON_MINI[:20]))
+    protocol.data_received(bytes(TestData.AIDON_MINI))
+    assert received == [bytes(TestData.AIDON_MINI)]
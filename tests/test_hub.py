@@ -0,0 +1,298 @@
+import asyncio
+import subprocess
+import sys
+import threading
+from types import SimpleNamespace
+import custom_components.ams.hub as ams
+from custom_components.ams.const import (
+    HAN_ACTIVE_ENERGY_IMPORT,
+    HOURLY_SENSORS,
+    SIGNAL_UPDATE_AMS_SENSOR,
+)
+from custom_components.ams.hub import AmsHub
+from custom_components.ams.sensor import AmsSensor
+from custom_components.ams.parsers import aidon
+from custom_components.ams.parsers.crc import crc16_x25
+from custom_components.ams.parsers.hdlc import HdlcFrameBuffer
+from .common_test_data import TestData
+
+sys.path.append('../')
+
+
+def _hass(loop, **attrs):
+    async def add_executor_job(target, *args):
+        return await loop.run_in_executor(None, target, *args)
+
+    return SimpleNamespace(loop=loop, data={},
+                           async_add_executor_job=add_executor_job,
+                           async_create_task=loop.create_task, **attrs)
+
+
+def _frame(pkg):
+    frames = HdlcFrameBuffer()
+    frames.feed(bytes(pkg))
+    return frames.pop()
+
+
+def _receive(hub, loop, pkg):
+    hub._handle_frame(_frame(pkg))
+    if hub._load_task is not None:
+        # The parser of the first frame is imported in the executor
+        loop.run_until_complete(hub._load_task)
+    loop.call_soon(loop.stop)
+    loop.run_forever()
+
+
+def test_find_parser_kamstrup():
+    pkg = TestData.KAMSTRUP
+    parser_detected = AmsHub._find_parser(pkg)
+    assert parser_detected == "kamstrup"
+
+def test_find_parser_aidon_short():
+    pkg = TestData.AIDON_SHORT
+    parser_detected = AmsHub._find_parser(pkg)
+    assert parser_detected == "aidon"
+
+def test_find_parser_aidon_se_3ph():
+    pkg = TestData.AIDON_SE_3PH
+    parser_detected = AmsHub._find_parser(pkg)
+    assert parser_detected == "aidon_se"
+
+def test_find_parser_kaifa_long():
+    # Kaifa MA304H4D Swedish
+    pkg = TestData.KAIFA_MA304H4D_LONG
+    parser_detected = AmsHub._find_parser(pkg)
+    assert parser_detected == "kaifa"
+
+def test_find_parser_kaifa_hourly():
+    pkg = TestData.KAIFA_HOURLY
+    parser_detected = AmsHub._find_parser(pkg)
+    assert parser_detected == "kaifa"
+
+def test_find_parser_kaifa_se():
+    pkg = TestData.KAIFA_MA304H4_SE
+    parser_detected = AmsHub._find_parser(pkg)
+    assert parser_detected == "kaifa_se"
+
+def test_find_no_parser():
+    pkg = [1, 2, 3, 4, 5]
+    parser_detected = AmsHub._find_parser(pkg)
+    assert parser_detected == None
+
+
+def test_update_only_sensors_in_frame(monkeypatch):
+    loop = asyncio.new_event_loop()
+    sent = []
+    monkeypatch.setattr(ams, "async_dispatcher_send",
+                        lambda hass, signal: sent.append(signal))
+    known, _ = aidon.parse_data({}, TestData.AIDON_HOURLY)
+    hub = AmsHub(_hass(loop),
+                 {"meter_manufacturer": "aidon"})
+    hub.devices.update(known)
+    _receive(hub, loop, TestData.AIDON_HOURLY)
+    assert sorted(sent) == sorted("ams_update_ams_" + key for key in known)
+    sent.clear()
+    short, _ = aidon.parse_data({}, TestData.AIDON_SHORT)
+    _receive(hub, loop, TestData.AIDON_SHORT)
+    assert sorted(sent) == sorted("ams_update_ams_" + key for key in short)
+    assert "ams_update_ams_ams_active_energy_import" not in sent
+    loop.close()
+
+
+def test_restored_hourly_sensors_updated(monkeypatch):
+    loop = asyncio.new_event_loop()
+    short, _ = aidon.parse_data({}, TestData.AIDON_SHORT)
+    hub = AmsHub(_hass(loop),
+                 {"meter_manufacturer": "aidon"})
+    hub.devices.update(short)
+    # Created at start to restore the state, before a value is read
+    hub.created_but_not_read.update(HOURLY_SENSORS)
+    sensor = AmsSensor(None, hub, {"name": HAN_ACTIVE_ENERGY_IMPORT})
+    writes = []
+    monkeypatch.setattr(sensor, "async_write_ha_state",
+                        lambda: writes.append(sensor.state))
+    callbacks = {SIGNAL_UPDATE_AMS_SENSOR.format(
+        hub.key, HAN_ACTIVE_ENERGY_IMPORT): sensor._update_callback}
+    monkeypatch.setattr(ams, "async_dispatcher_send",
+                        lambda hass, signal: callbacks.get(signal, list)())
+    _receive(hub, loop, TestData.AIDON_HOURLY)
+    hourly, _ = aidon.parse_data({}, TestData.AIDON_HOURLY)
+    expected = hourly[HAN_ACTIVE_ENERGY_IMPORT]["state"]
+    assert sensor.state == expected
+    assert writes == [expected]
+    _receive(hub, loop, TestData.AIDON_SHORT)
+    assert writes == [expected]
+    loop.close()
+
+
+def test_aggregated_power_published_per_window(monkeypatch):
+    loop = asyncio.new_event_loop()
+    sent = []
+    monkeypatch.setattr(ams, "async_dispatcher_send",
+                        lambda hass, signal: sent.append(signal))
+    known, _ = aidon.parse_data({}, TestData.AIDON_HOURLY)
+    hub = AmsHub(_hass(loop),
+                 {"meter_manufacturer": "aidon", "aggregate_window": 3600})
+    hub.devices.update(known)
+    for pkg in (TestData.AIDON_HOURLY, TestData.AIDON_SHORT):
+        _receive(hub, loop, pkg)
+    # The first value is published, the next ones wait for the window
+    assert sent.count("ams_update_ams_ams_active_power_import") == 1
+    assert sent.count("ams_update_ams_ams_voltage_l1") == 2
+    loop.close()
+
+
+AIDON_DETECTED = {
+    "meter_manufacturer": "aidon",
+    "swedish": False,
+    "meter_serial": "7359992895913195",
+    "obis_list_version": "AIDON_V0001",
+    "meter_type": "6534 3-phase Meter with CB and Neutral Current Measurement",
+}
+
+
+def test_detection_stored_in_config_entry(monkeypatch):
+    loop = asyncio.new_event_loop()
+    monkeypatch.setattr(ams, "async_dispatcher_send", lambda hass, signal: 0)
+    updates = []
+
+    def update_entry(entry, data):
+        updates.append(data)
+        entry.data = data
+
+    config_entry = SimpleNamespace(entry_id="1",
+                                   data={"meter_manufacturer": "auto"})
+    hass = _hass(loop, config_entries=SimpleNamespace(
+        async_update_entry=update_entry))
+    hub = AmsHub(hass, config_entry.data, config_entry)
+    _receive(hub, loop, TestData.AIDON_HOURLY)
+    _receive(hub, loop, TestData.AIDON_HOURLY)
+    assert updates == [{"meter_manufacturer": "auto",
+                        "detected": AIDON_DETECTED}]
+    loop.close()
+
+
+def test_stored_detection_binds_parser(monkeypatch):
+    loop = asyncio.new_event_loop()
+    monkeypatch.setattr(ams, "async_dispatcher_send", lambda hass, signal: 0)
+    hub = AmsHub(_hass(loop),
+                 {"meter_manufacturer": "auto", "detected": AIDON_DETECTED})
+    # Known before the first frame, sensors are created from a short list
+    assert hub.meter_manufacturer == "aidon"
+    assert hub.meter_serial == "7359992895913195"
+    assert not hub.missing_attrs()
+    _receive(hub, loop, TestData.AIDON_SHORT)
+    assert hub._decoder.parser is aidon
+    assert "ams_active_power_import" in hub.data
+    loop.close()
+
+
+def test_parser_imported_in_executor(monkeypatch):
+    loop = asyncio.new_event_loop()
+    monkeypatch.setattr(ams, "async_dispatcher_send", lambda hass, signal: 0)
+    threads = []
+
+    def load_parser(manufacturer):
+        threads.append(threading.current_thread())
+        return aidon
+
+    monkeypatch.setattr(ams, "load_parser", load_parser)
+    # After detection, the first frame is decoded once it is imported
+    hub = AmsHub(_hass(loop), {"meter_manufacturer": "auto"})
+    _receive(hub, loop, TestData.AIDON_HOURLY)
+    assert "ams_active_energy_import" in hub.data
+    # Stored, imported when connecting
+    hub = AmsHub(_hass(loop), {"meter_manufacturer": "auto",
+                               "detected": AIDON_DETECTED})
+    loop.run_until_complete(hub.async_connect())
+    assert len(threads) == 2
+    hub._handle_frame(_frame(TestData.AIDON_SHORT))
+    assert hub._load_task is None
+    assert "ams_active_power_import" in hub.data
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
+    loop.close()
+
+
+def test_stored_detection_rejected_by_first_frame(monkeypatch):
+    loop = asyncio.new_event_loop()
+    monkeypatch.setattr(ams, "async_dispatcher_send", lambda hass, signal: 0)
+    detected = dict(AIDON_DETECTED, meter_manufacturer="kamstrup")
+    hub = AmsHub(_hass(loop),
+                 {"meter_manufacturer": "auto", "detected": detected})
+    _receive(hub, loop, TestData.AIDON_HOURLY)
+    assert hub.meter_manufacturer == "auto"
+    assert hub._decoder is None
+    assert hub.meter_serial is None
+    _receive(hub, loop, TestData.AIDON_HOURLY)
+    assert hub.meter_manufacturer == "aidon"
+    assert hub.meter_serial == "7359992895913195"
+    loop.close()
+
+
+def _other_meter(pkg, serial):
+    """Return pkg with the meter serial replaced and a valid FCS."""
+    frame = bytearray(pkg)
+    start = frame.index(AIDON_DETECTED["meter_serial"].encode())
+    frame[start:start + len(serial)] = serial.encode()
+    fcs = crc16_x25(frame, 1, len(frame) - 3)
+    frame[-3:-1] = fcs.to_bytes(2, "little")
+    return frame
+
+
+def test_meter_serial_changed(monkeypatch):
+    loop = asyncio.new_event_loop()
+    monkeypatch.setattr(ams, "async_dispatcher_send", lambda hass, signal: 0)
+    updates = []
+
+    def update_entry(entry, data):
+        updates.append(data)
+        entry.data = data
+
+    config_entry = SimpleNamespace(entry_id="1",
+                                   data={"meter_manufacturer": "auto"})
+    hass = _hass(loop, config_entries=SimpleNamespace(
+        async_update_entry=update_entry))
+    hub = AmsHub(hass, config_entry.data, config_entry)
+    _receive(hub, loop, TestData.AIDON_HOURLY)
+    assert hub.meter_serial == "7359992895913195"
+    _receive(hub, loop, _other_meter(TestData.AIDON_HOURLY,
+                                     "7359992895913196"))
+    assert hub.meter_serial == "7359992895913196"
+    assert not hub.missing_attrs()
+    assert [data["detected"]["meter_serial"] for data in updates] == [
+        "7359992895913195", "7359992895913196"]
+    loop.close()
+
+
+def test_hubs_per_config_entry(monkeypatch):
+    loop = asyncio.new_event_loop()
+    sent = []
+    monkeypatch.setattr(ams, "async_dispatcher_send",
+                        lambda hass, signal: sent.append(signal))
+    hass = _hass(loop, config_entries=SimpleNamespace(
+        async_update_entry=lambda entry, data: None))
+    hubs = [AmsHub(hass, {"meter_manufacturer": manufacturer},
+                   SimpleNamespace(entry_id=entry_id, data={}))
+            for entry_id, manufacturer in (("1", "aidon"), ("2", "kaifa"))]
+    _receive(hubs[0], loop, TestData.AIDON_SHORT)
+    _receive(hubs[1], loop, TestData.KAIFA_HOURLY)
+    # Each meter announces its sensors on the signal of its own entry
+    assert sent == ["ams_new_sensor_1", "ams_new_sensor_2"]
+    assert hubs[0].meter_manufacturer == "aidon"
+    assert hubs[1].meter_manufacturer == "kaifa"
+    assert hubs[0].sensor_data is not hubs[1].sensor_data
+    hubs[0].devices.update(hubs[0].sensor_data)
+    sent.clear()
+    _receive(hubs[0], loop, TestData.AIDON_SHORT)
+    assert "ams_update_1_ams_active_power_import" in sent
+    assert not hubs[1].devices
+    loop.close()
+
+
+def test_hub_imported_with_home_assistant():
+    script = ("import sys, custom_components.ams; "
+              "print(custom_components.ams.async_setup.__module__)")
+    output = subprocess.run([sys.executable, "-c", script], check=True,
+                            capture_output=True, text=True).stdout
+    assert output.strip() == "custom_components.ams.hub"
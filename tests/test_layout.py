@@ -0,0 +1,88 @@
+import sys
+from custom_components.ams.const import (
+    HAN_ACTIVE_ENERGY_IMPORT,
+    HAN_ACTIVE_POWER_IMPORT,
+    HAN_METER_LIST_TYPE,
+    SENSOR_COMMON_OBIS_MAP,
+)
+from custom_components.ams.parsers import aidon
+from custom_components.ams.parsers.layout import (
+    PACKET_SIZE,
+    TAG_DOUBLE_LONG_UNSIGNED,
+    TAG_STRING_13,
+    TAG_VISIBLE_STRING,
+    Field,
+    Sensor,
+    Shift,
+    ValueType,
+    compile_fixed,
+    compile_obis,
+    date_time,
+    int16,
+    obis_date_time,
+    text,
+    uint8,
+    uint32,
+)
+from .common_test_data import TestData
+
+sys.path.append('../')
+
+SENSORS = {HAN_ACTIVE_POWER_IMPORT: Sensor("W", "mdi:gauge")}
+
+
+def test_decoders():
+    pkt = bytes([0x07, 0xE4, 2, 3, 1, 21, 5, 9, 0x41, 0x42])
+    assert date_time(pkt, 0, 8) == "2020-2-3 21:05:09"
+    assert obis_date_time(pkt, 0, 8) == "2020-2-3-21-05-05-09"
+    assert text(pkt, 8, 10) == "AB"
+    assert uint32(pkt, 0, 4) == 0x07E40203
+    assert int16(bytes([0xFF, 0xFE]), 0, 2) == -2
+
+
+def test_fixed_layout_shift():
+    decode = compile_fixed(
+        header=(Field(HAN_METER_LIST_TYPE, 0, 1, uint8),),
+        lists={1: (Field("power", 2, 6, uint32, 10,
+                         HAN_ACTIVE_POWER_IMPORT),)},
+        default=(),
+        sensors=SENSORS,
+        shift=Shift(1, 7, 2, -1),
+    )
+    stored, han_data = decode({}, [1, 0, 0, 0, 1, 0, 9])
+    assert han_data["power"] == 25.6
+    assert stored == {HAN_ACTIVE_POWER_IMPORT: {
+        "state": 25.6,
+        "attributes": {"unit_of_measurement": "W", "icon": "mdi:gauge"},
+    }}
+    # The byte at 1 moves the field one byte back
+    _, han_data = decode({}, [1, 7, 0, 0, 1, 0, 9])
+    assert han_data["power"] == 0x07000001 / 10
+
+
+def test_fixed_layout_unknown_list():
+    decode = compile_fixed(
+        header=(Field(HAN_METER_LIST_TYPE, 0, 1, uint8),),
+        lists={},
+        default=(Field("power", 1, 5, uint32, None,
+                       HAN_ACTIVE_POWER_IMPORT),),
+        sensors=SENSORS,
+    )
+    stored, _ = decode({}, [3, 0, 0, 1, 0])
+    assert stored[HAN_ACTIVE_POWER_IMPORT]["state"] == 256
+
+
+def test_obis_layout_matches_parser():
+    unscaled = compile_obis(
+        header=(PACKET_SIZE, Field(HAN_METER_LIST_TYPE, 19, 20, uint8)),
+        common=SENSOR_COMMON_OBIS_MAP,
+        values={TAG_DOUBLE_LONG_UNSIGNED: ValueType(uint32, 4)},
+        strings=(TAG_VISIBLE_STRING, TAG_STRING_13),
+    )
+    pkg = TestData.AIDON_HOURLY
+    expected, expected_han = aidon.parse_data({}, pkg)
+    stored, han_data = unscaled({}, pkg)
+    assert han_data[HAN_ACTIVE_ENERGY_IMPORT] == round(
+        expected_han[HAN_ACTIVE_ENERGY_IMPORT] * 100)
+    assert (stored[HAN_ACTIVE_POWER_IMPORT]
+            == expected[HAN_ACTIVE_POWER_IMPORT])
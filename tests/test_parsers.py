@@ -0,0 +1,109 @@
+import subprocess
+import sys
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorStateClass,
+)
+from custom_components.ams.const import (
+    DEVICE_CLASS_ENERGY,
+    HAN_ACTIVE_ENERGY_IMPORT,
+    HAN_ACTIVE_POWER_IMPORT,
+    OBIS_REGISTRY,
+    SENSOR_COMMON_OBIS_MAP,
+    SENSOR_OBIS_MAP,
+    STATE_CLASS_TOTAL_INCREASING,
+)
+from custom_components.ams.parsers import (
+    aidon,
+    as_bytes,
+    obis_index,
+    obis_walk,
+    signed_decode,
+)
+from custom_components.ams.parsers.hdlc import HdlcFrameBuffer
+from .common_test_data import TestData
+
+sys.path.append('../')
+
+
+def test_obis_index_variants():
+    index = obis_index({"single": [1, 0, 1, 7, 0, 255],
+                        "double": [[1, 1, 1, 7, 0, 255],
+                                   [1, 0, 2, 7, 0, 255]]})
+    assert index == {bytes([1, 0, 1, 7, 0, 255]): "single",
+                     bytes([1, 1, 1, 7, 0, 255]): "double",
+                     bytes([1, 0, 2, 7, 0, 255]): "double"}
+
+
+def test_as_bytes():
+    buffer = HdlcFrameBuffer()
+    buffer.feed(bytes(TestData.AIDON_SHORT))
+    frame = buffer.pop()
+    assert as_bytes(frame) is frame
+    assert as_bytes(list(frame)) == frame
+
+
+def test_signed_decode():
+    assert signed_decode([0x01, 0x05]) == 261
+    assert signed_decode([0xFF, 0xFE]) == -2
+
+
+def test_parse_data_list_and_bytes():
+    pkg = TestData.AIDON_HOURLY
+    assert aidon.parse_data({}, pkg) == aidon.parse_data({}, bytes(pkg))
+
+
+def test_obis_walk_positions():
+    index = obis_index(SENSOR_OBIS_MAP)
+    pkt = TestData.AIDON_HOURLY
+    found = obis_walk(pkt, index)
+    assert found
+    for key, code, pos in found:
+        assert index[code] == key
+        assert bytes(pkt[pos - 2:pos + 6]) == b"\x09\x06" + code
+
+
+def test_obis_walk_unknown_code():
+    pkt = [0x09, 0x06, 9, 9, 9, 9, 9, 9, 0x09, 0x06, 1, 0, 1, 7, 0, 255]
+    index = obis_index({"known": [1, 0, 1, 7, 0, 255]})
+    assert obis_walk(pkt, index) == [("known", bytes([1, 0, 1, 7, 0, 255]),
+                                      10)]
+
+
+def test_obis_registry_covers_maps():
+    for obis_map in (SENSOR_COMMON_OBIS_MAP, SENSOR_OBIS_MAP):
+        for code, key in obis_index(obis_map).items():
+            record = OBIS_REGISTRY[code]
+            assert record.key == key
+            assert record.obis == ".".join(str(elem) for elem in code)
+
+
+def test_obis_registry_records():
+    power = OBIS_REGISTRY[bytes([1, 0, 1, 7, 0, 255])]
+    assert power.key == HAN_ACTIVE_POWER_IMPORT
+    assert power.obis == "1.0.1.7.0.255"
+    assert power.unit == "W"
+    assert power.icon == "mdi:gauge"
+    assert power.state_class is None
+    energy = OBIS_REGISTRY[bytes([1, 0, 1, 8, 0, 255])]
+    assert energy.key == HAN_ACTIVE_ENERGY_IMPORT
+    assert energy.unit == "kWh"
+    assert energy.state_class == SensorStateClass.TOTAL_INCREASING
+    assert energy.device_class == SensorDeviceClass.ENERGY
+
+
+def test_classes_match_home_assistant():
+    assert SensorDeviceClass(DEVICE_CLASS_ENERGY) is SensorDeviceClass.ENERGY
+    assert (SensorStateClass(STATE_CLASS_TOTAL_INCREASING)
+            is SensorStateClass.TOTAL_INCREASING)
+
+
+def test_parsers_import_without_home_assistant():
+    # As if Home Assistant was not installed
+    script = ("import sys; sys.modules['homeassistant'] = None; "
+              "import custom_components.ams.collector; "
+              "print(any(name.startswith('homeassistant') "
+              "for name in sys.modules if sys.modules[name]))")
+    output = subprocess.run([sys.executable, "-c", script], check=True,
+                            capture_output=True, text=True).stdout
+    assert output.strip() == "False"
@@ -0,0 +1,53 @@
+import sys
+from copy import deepcopy
+from custom_components.ams.parsers import kaifa
+from custom_components.ams.parsers.records import (MeterIdentity,
+                                                   SensorRecord,
+                                                   sensor_record)
+from .common_test_data import TestData
+
+sys.path.append('../')
+
+
+def test_record_reads_like_dict():
+    identity = (("meter_serial", "123"),)
+    record = sensor_record("ams_active_power_import", 1590, "2020-2-3",
+                           "W", "mdi:gauge", identity)
+    expected = {
+        "state": 1590,
+        "attributes": {
+            "timestamp": "2020-2-3",
+            "meter_serial": "123",
+            "unit_of_measurement": "W",
+            "icon": "mdi:gauge",
+        },
+    }
+    assert record == expected
+    assert record.get("state") == 1590
+    assert record.get("attributes") == expected["attributes"]
+    assert deepcopy(record) == expected
+
+
+def test_record_shares_static_attributes():
+    first, _ = kaifa.parse_data({}, TestData.KAIFA_MA304H4D_LONG)
+    second, _ = kaifa.parse_data({}, TestData.KAIFA_MA304H4D_LONG)
+    record = first["ams_active_power_import"]
+    assert isinstance(record, SensorRecord)
+    assert record.meta is second["ams_active_power_import"].meta
+    attrs = record["attributes"]
+    attrs["icon"] = "mdi:changed"
+    assert record["attributes"]["icon"] == "mdi:gauge"
+
+
+def test_meter_identity_from_han_data():
+    identity = MeterIdentity()
+    assert not identity.complete
+    assert identity.missing() == ["meter_serial", "meter_manufacturer",
+                                  "meter_type"]
+    _, han_data = kaifa.parse_data({}, TestData.KAIFA_MA304H4D_LONG)
+    identity.update(han_data)
+    assert identity.complete
+    assert identity.serial == "7340157011274532"
+    assert identity.meter_type == "Poly Phase 3 Phase 230V/400V 4-Wire meter"
+    identity.update({})
+    assert identity.missing() == []
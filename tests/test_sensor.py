@@ -0,0 +1,91 @@
+import sys
+from types import SimpleNamespace
+from custom_components.ams.const import DEFAULT_DEADBAND
+import custom_components.ams.sensor as sensor_module
+from custom_components.ams.sensor import AmsSensor, diagnostic_sensors
+from custom_components.ams.stats import PipelineStats, STAGE_PARSE
+
+sys.path.append('../')
+
+
+def _sensor(monkeypatch, name, min_interval=0):
+    hub = SimpleNamespace(key="1", devices={name}, sensor_data={},
+                          meter_serial="123",
+                          deadband=dict(DEFAULT_DEADBAND),
+                          min_interval=min_interval, suppressed_writes=0)
+    sensor = AmsSensor(SimpleNamespace(), hub, {"name": name})
+    writes = []
+    monkeypatch.setattr(sensor, "async_write_ha_state",
+                        lambda: writes.append(sensor.state))
+
+    def update(value):
+        hub.sensor_data[name] = {"state": value, "attributes": {}}
+        sensor._update_callback()
+
+    return hub, update, writes
+
+
+def test_deadband_voltage(monkeypatch):
+    hub, update, writes = _sensor(monkeypatch, "ams_voltage_l1")
+    for value in (230.0, 230.0, 230.3, 230.6, 231.2):
+        update(value)
+    assert writes == [230.0, 230.6, 231.2]
+    assert hub.suppressed_writes == 2
+
+
+def test_deadband_power(monkeypatch):
+    hub, update, writes = _sensor(monkeypatch, "ams_active_power_import")
+    for value in (1500, 1505, 1512, 1511):
+        update(value)
+    assert writes == [1500, 1512]
+    assert hub.suppressed_writes == 2
+
+
+def test_energy_always_written(monkeypatch):
+    hub, update, writes = _sensor(monkeypatch, "ams_active_energy_import")
+    for value in (100.0, 100.0, 100.001):
+        update(value)
+    assert writes == [100.0, 100.0, 100.001]
+    assert hub.suppressed_writes == 0
+
+
+def test_min_interval(monkeypatch):
+    hub, update, writes = _sensor(monkeypatch, "ams_active_power_import",
+                                  min_interval=3600)
+    scheduled = []
+
+    def call_later(hass, delay, action):
+        scheduled.append(action)
+        return lambda: scheduled.remove(action)
+
+    monkeypatch.setattr(sensor_module, "async_call_later", call_later)
+    update(1000)
+    update(3000)
+    update(2000)
+    assert writes == [1000]
+    assert hub.suppressed_writes == 2
+    # One write of the latest value when the interval is over
+    assert len(scheduled) == 1
+    monkeypatch.setattr(hub, "min_interval", 0)
+    scheduled[0](None)
+    assert writes == [1000, 2000]
+
+
+async def test_diagnostic_sensors():
+    stats = PipelineStats()
+    stats.rejected["frame_crc"] = 3
+    stats.rejected["header_crc"] = 1
+    stats.latency[STAGE_PARSE].record(150_000)
+    hub = SimpleNamespace(meter_serial="123", stats=stats)
+    sensors = {sensor.key: sensor for sensor in diagnostic_sensors(hub)}
+    for sensor in sensors.values():
+        await sensor.async_update()
+    assert sensors["ams_crc_failures"].native_value == 3
+    assert sensors["ams_crc_failures"].unique_id == "ams_crc_failures_123"
+    parse = sensors["ams_parse_latency"]
+    assert parse.native_value == 0.2
+    assert parse.extra_state_attributes["count"] == 1
+    assert sensors["ams_read_latency"].native_value is None
+    assert sensors["ams_rejected_frames"].native_value == 4
+    assert sensors["ams_rejected_frames"].extra_state_attributes == {
+        "frame_crc": 3, "header_crc": 1}
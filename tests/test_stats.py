@@ -0,0 +1,98 @@
+import sys
+import custom_components.ams.stats as stats_module
+from custom_components.ams.parsers import aidon, kaifa
+from custom_components.ams.parsers.decoder import MeterDecoder
+from custom_components.ams.parsers.hdlc import HdlcFrameBuffer, HdlcProtocol
+from custom_components.ams.stats import (LatencyHistogram, PipelineStats,
+                                         STAGE_PARSE, STAGE_READ,
+                                         STAGE_VALIDATE)
+from .common_test_data import TestData
+
+sys.path.append('../')
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(50) is None
+    for _ in range(90):
+        histogram.record(15_000)
+    for _ in range(9):
+        histogram.record(300_000)
+    histogram.record(5_000_000_000)
+    assert histogram.summary() == {"p50": 0.02, "p95": 0.5, "p99": 0.5,
+                                   "count": 100}
+    # Above the last bucket is reported as its bound
+    assert histogram.percentile(100) == 1000.0
+
+
+def test_frame_rate(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(stats_module.time, "monotonic", lambda: now[0])
+    stats = PipelineStats()
+    assert stats.frame_rate is None
+    for _ in range(30):
+        now[0] += 2.5
+        stats.count_frame()
+        # The same rate before and after the first window is over
+        assert stats.frame_rate == 0.4
+    assert stats.frames == 30
+    assert stats.frame_rate == 0.4
+    # The rate drops when the frames stop
+    now[0] += 60
+    assert stats.frame_rate == 0.08
+    now[0] += 60
+    assert stats.frame_rate == 0
+
+
+def test_stages_recorded():
+    stats = PipelineStats()
+    frames = []
+    protocol = HdlcProtocol(frames.append, stats=stats)
+    protocol.data_received(bytes(TestData.AIDON_HOURLY))
+    decoder = MeterDecoder(aidon, stats=stats)
+    decoder.decode(frames[0])
+    for stage in (STAGE_READ, STAGE_VALIDATE, STAGE_PARSE):
+        assert stats.latency[stage].total == 1
+
+
+def test_timeouts_counted():
+    stats = PipelineStats()
+    protocol = HdlcProtocol(lambda frame: None, timeout=-1, stats=stats)
+    protocol.data_received(bytes(TestData.AIDON_HOURLY[:10]))
+    protocol.data_received(bytes(TestData.AIDON_HOURLY))
+    assert stats.timeouts == 1
+
+
+def test_rejected_frames_classified():
+    stats = PipelineStats()
+    decoder = MeterDecoder(kaifa, stats=stats)
+    stream = ([0, 1, 2] + TestData.KAIFA_HOURLY
+              + TestData.KAIFA_INCORRECT_PKG_CRC)
+    assert len(list(decoder.feed(bytes(stream)))) == 1
+    decoder.decode(TestData.KAIFA_INCORRECT_HEADER_CRC)
+    decoder.decode(TestData.KAIFA_INVALID_DATA_FLAG)
+    decoder.decode(TestData.KAIFA_INVALID_PKG_SIZE)
+    assert stats.rejected == {"frame_crc": 1, "header_crc": 1,
+                              "data_flag": 1, "packet_size": 1}
+    assert stats.crc_failures == 1
+    assert stats.discarded_bytes == 3
+    assert stats.success_ratio == 20.0
+
+
+def test_success_ratio_window():
+    stats = PipelineStats()
+    assert stats.success_ratio is None
+    for _ in range(50):
+        stats.reject("timeout")
+    for _ in range(100):
+        stats.count_frame()
+    assert stats.success_ratio == 100.0
+    assert stats.timeouts == 50
+
+
+def test_invalid_frame_end_counted():
+    stats = PipelineStats()
+    frames = HdlcFrameBuffer(stats=stats)
+    frames.feed(bytes(TestData.KAIFA_HOURLY[:-1] + [0]))
+    assert frames.pop() is None
+    assert stats.rejected == {"frame_flag": 1}
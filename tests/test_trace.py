@@ -0,0 +1,41 @@
+import logging
+import sys
+from custom_components.ams.trace import FrameTracer, HexDump
+
+sys.path.append('../')
+
+_LOGGER = logging.getLogger("custom_components.ams.test_trace")
+
+
+class Unprintable:
+    def __iter__(self):
+        raise AssertionError("rendered while debug logging is off")
+
+
+def test_hex_dump():
+    assert str(HexDump([126, 160, 42])) == "7e a0 2a"
+    assert str(HexDump(b"\x7e\x00")) == "7e 00"
+
+
+def test_hex_dump_not_rendered_when_disabled(caplog):
+    caplog.set_level(logging.INFO, logger=_LOGGER.name)
+    _LOGGER.debug("dump %s", HexDump(Unprintable()))
+    assert not caplog.records
+
+
+def test_tracer_samples(caplog):
+    caplog.set_level(logging.DEBUG, logger=_LOGGER.name)
+    tracer = FrameTracer(_LOGGER, sample=3)
+    for i in range(7):
+        tracer.trace("frame", bytes([126, i]))
+    assert [record.getMessage() for record in caplog.records] == [
+        "frame (frame 3, 2 bytes): 7e 02",
+        "frame (frame 6, 2 bytes): 7e 05",
+    ]
+
+
+def test_tracer_disabled(caplog):
+    caplog.set_level(logging.INFO, logger=_LOGGER.name)
+    tracer = FrameTracer(_LOGGER)
+    tracer.trace("frame", Unprintable())
+    assert not caplog.records